@@ -1,11 +1,33 @@
+import asyncio
+import contextlib
+import logging
+import threading
 import reflex as rx
-from app.states.document_state import DocumentState
+from app.states.document_state import (
+    DocumentState,
+    SAMPLE_DOCUMENTS,
+    index_missing_documents,
+    run_jobs,
+)
 from app.components.sidebar import sidebar
 from app.components.header import header
 from app.components.upload_area import upload_area
 from app.components.document_list import library_view
 from app.components.document_detail import document_detail
 from app.components.search_view import search_view
+from app.services import pipeline, related_graph, settings, uploads
+from app.services.checkpoint import checkpoint
+from app.services.document_store import document_store
+from app.services.embedding_matrix import embedding_matrix
+from app.services.ingestion import ingestion_engine
+from app.services.job_queue import job_queue
+from app.services.facet_index import facet_index
+from app.services.keyword_index import keyword_index
+from app.services.library_index import library_index
+from app.services.model_registry import model_registry
+from app.services.search_cache import search_cache
+from app.services.server_lock import server_lock
+from app.services.vector_index import passage_index, vector_index
 
 
 def dashboard_widgets() -> rx.Component:
@@ -100,4 +122,82 @@ app = rx.App(
         "https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap"
     ],
 )
-app.add_page(index, route="/")
\ No newline at end of file
+app.add_page(index, route="/", on_load=DocumentState.load_documents)
+
+
+@contextlib.asynccontextmanager
+async def load_storage():
+    server_lock.acquire()
+    document_store.seed(SAMPLE_DOCUMENTS)
+    if rx.get_upload_dir().exists():
+        uploads.remove_partial_uploads(rx.get_upload_dir())
+    embedding_matrix.load()
+    if legacy := document_store.legacy_embeddings():
+        # Databases from before the embedding matrix kept vectors in rows.
+        for doc_id, embedding in legacy:
+            embedding_matrix.put(doc_id, embedding)
+        embedding_matrix.save()
+        document_store.clear_legacy_embeddings()
+    vector_index.load()
+    if not len(vector_index) and len(embedding_matrix):
+        vector_index.add_many(*embedding_matrix.vectors())
+        vector_index.save()
+    passage_index.load()
+    keyword_index.load()
+    related_graph.related_graph.load()
+    threading.Thread(
+        target=library_index.load, name="library-index", daemon=True
+    ).start()
+    threading.Thread(target=facet_index.load, name="facet-index", daemon=True).start()
+    if len(vector_index) and not len(passage_index):
+        passage_index.needs_rebuild = True
+    if (
+        vector_index.needs_rebuild
+        or passage_index.needs_rebuild
+        or embedding_matrix.needs_rebuild
+    ):
+        threading.Thread(
+            target=pipeline.reembed_documents, name="reembed", daemon=True
+        ).start()
+    elif related_graph.related_graph.needs_rebuild or settings.RELATED_REBUILD:
+        threading.Thread(
+            target=related_graph.rebuild, name="related-graph", daemon=True
+        ).start()
+    else:
+        threading.Thread(
+            target=index_missing_documents, name="index-missing", daemon=True
+        ).start()
+    if settings.MODEL_WARMUP != "off":
+        warm_up = ingestion_engine.warm_up()
+        if settings.EMBEDDING_BACKEND != "hashing":
+            # Queries are embedded in this process, not in the ingestion pool.
+            threading.Thread(
+                target=model_registry.embedding_model, name="embedder", daemon=True
+            ).start()
+        if settings.MODEL_WARMUP == "blocking":
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in warm_up))
+    # Uploads queued before the job queue existed, or whose job was lost.
+    unfinished = document_store.get_many(
+        document_store.ids("uploaded") + document_store.ids("processing")
+    )
+    job_queue.recover(doc_id for doc_id, doc in unfinished.items() if doc["file_hash"])
+    job_queue.expire_stale()
+    if dead := job_queue.dead_letters():
+        logging.warning(f"{len(dead)} documents failed processing: {dead}")
+    jobs = asyncio.create_task(run_jobs(app))
+    checkpoints = asyncio.create_task(checkpoint.run())
+    yield
+    jobs.cancel()
+    checkpoints.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await jobs
+    with contextlib.suppress(asyncio.CancelledError):
+        await checkpoints
+    job_queue.release()
+    logging.info(f"Search cache metrics: {search_cache.metrics()}")
+    checkpoint.flush()
+    ingestion_engine.shutdown()
+    server_lock.release()
+
+
+app.register_lifespan_task(load_storage)
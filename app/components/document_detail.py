@@ -1,5 +1,46 @@
 import reflex as rx
-from app.states.document_state import DocumentState
+from app.components.scroll import scroll_remaining
+from app.states.document_state import DocumentPage, DocumentState
+
+TEXT_SCROLL_ID = "text-scroll"
+
+
+def text_page(page: DocumentPage) -> rx.Component:
+    return rx.el.section(
+        rx.el.span(
+            f"Page {page['page_no']}",
+            class_name="block text-xs font-medium text-gray-400 uppercase mb-2",
+        ),
+        rx.el.p(
+            page["text"],
+            class_name="text-gray-700 leading-relaxed whitespace-pre-wrap",
+        ),
+        # Let the browser skip layout of pages scrolled out of view.
+        style={"content_visibility": "auto", "contain_intrinsic_size": "auto 800px"},
+        class_name="pb-6 mb-6 border-b border-gray-100 last:border-b-0",
+    )
+
+
+def text_viewer_footer() -> rx.Component:
+    return rx.el.div(
+        rx.cond(
+            DocumentState.detail_pages_trimmed,
+            rx.el.button(
+                "Back to start",
+                on_click=DocumentState.reload_detail_pages,
+                class_name="px-3 py-1.5 text-sm font-medium text-gray-600 hover:bg-gray-100 rounded-lg",
+            ),
+        ),
+        rx.cond(
+            DocumentState.detail_has_more & (DocumentState.detail_pages.length() > 0),
+            rx.el.button(
+                "Load more pages",
+                on_click=DocumentState.load_more_pages,
+                class_name="px-3 py-1.5 text-sm font-medium text-indigo-600 hover:bg-indigo-50 rounded-lg",
+            ),
+        ),
+        class_name="flex items-center justify-center gap-2",
+    )
 
 
 def stage_indicator(label: str, stage_num: int, current_stage: int) -> rx.Component:
@@ -55,9 +96,25 @@ def document_detail() -> rx.Component:
                         class_name="mb-6",
                     ),
                     rx.el.div(
-                        rx.el.h4(
-                            "Processing Pipeline",
-                            class_name="text-sm font-semibold text-gray-900 mb-4 uppercase tracking-wider",
+                        rx.el.div(
+                            rx.el.h4(
+                                "Processing Pipeline",
+                                class_name="text-sm font-semibold text-gray-900 uppercase tracking-wider",
+                            ),
+                            rx.cond(
+                                (doc["status"] == "processing")
+                                | (doc["status"] == "uploaded"),
+                                rx.el.button(
+                                    rx.icon("circle-stop", size=14),
+                                    "Cancel",
+                                    on_click=lambda: DocumentState.cancel_processing(
+                                        doc["id"]
+                                    ),
+                                    class_name="flex items-center gap-1 text-xs font-medium text-red-600 hover:text-red-800",
+                                ),
+                                rx.fragment(),
+                            ),
+                            class_name="flex items-center justify-between mb-4",
                         ),
                         rx.el.div(
                             stage_indicator("Uploaded", 0, doc["pipeline_stage"]),
@@ -66,6 +123,14 @@ def document_detail() -> rx.Component:
                             stage_indicator("Indexed", 3, doc["pipeline_stage"]),
                             class_name="flex justify-between w-full relative px-4",
                         ),
+                        rx.cond(
+                            doc["stage_detail"] != "",
+                            rx.el.p(
+                                doc["stage_detail"],
+                                class_name="mt-4 text-xs text-center text-blue-600 font-medium",
+                            ),
+                            rx.fragment(),
+                        ),
                         class_name="bg-gray-50 p-6 rounded-xl border border-gray-200 mb-6",
                     ),
                     rx.el.div(
@@ -81,11 +146,20 @@ def document_detail() -> rx.Component:
                             class_name="flex items-center justify-between mb-4",
                         ),
                         rx.el.div(
-                            rx.el.p(
-                                doc["extracted_text"],
-                                class_name="text-gray-700 leading-relaxed whitespace-pre-wrap",
+                            rx.cond(
+                                DocumentState.detail_pages.length() > 0,
+                                rx.foreach(DocumentState.detail_pages, text_page),
+                                rx.el.p(
+                                    doc["extracted_text"],
+                                    class_name="text-gray-700 leading-relaxed whitespace-pre-wrap",
+                                ),
                             ),
-                            class_name="bg-white p-6 rounded-xl border border-gray-200 min-h-[300px] shadow-sm",
+                            text_viewer_footer(),
+                            id=TEXT_SCROLL_ID,
+                            on_scroll=DocumentState.on_text_scroll(
+                                scroll_remaining(TEXT_SCROLL_ID)
+                            ).throttle(200),
+                            class_name="bg-white p-6 rounded-xl border border-gray-200 min-h-[300px] max-h-[70vh] overflow-y-auto shadow-sm",
                         ),
                         class_name="mt-8",
                     ),
@@ -120,6 +194,17 @@ def document_detail() -> rx.Component:
                                 ),
                                 class_name="mb-4",
                             ),
+                            rx.el.div(
+                                rx.el.span(
+                                    "Pages",
+                                    class_name="text-xs text-gray-500 uppercase",
+                                ),
+                                rx.el.p(
+                                    doc["page_count"],
+                                    class_name="text-sm font-medium text-gray-900",
+                                ),
+                                class_name="mb-4",
+                            ),
                             rx.el.div(
                                 rx.el.span(
                                     "Document ID",
@@ -223,8 +308,8 @@ def document_detail() -> rx.Component:
                                         ),
                                         rx.el.button(
                                             "View",
-                                            on_click=lambda: DocumentState.select_document(
-                                                doc["id"]
+                                            on_click=lambda: (
+                                                DocumentState.select_document(doc["id"])
                                             ),
                                             class_name="text-sm text-indigo-600 hover:text-indigo-800 font-medium",
                                         ),
@@ -244,4 +329,4 @@ def document_detail() -> rx.Component:
             class_name="max-w-7xl mx-auto",
         ),
         class_name="p-4 md:p-8 w-full",
-    )
\ No newline at end of file
+    )
@@ -1,5 +1,9 @@
 import reflex as rx
-from app.states.document_state import DocumentState, Document
+from app.components.scroll import scroll_remaining
+from app.services import settings
+from app.states.document_state import DocumentState, DocumentSummary
+
+LIBRARY_SCROLL_ID = "library-scroll"
 
 
 def status_badge(status: str) -> rx.Component:
@@ -40,7 +44,7 @@ def status_badge(status: str) -> rx.Component:
     )
 
 
-def document_card(doc: Document) -> rx.Component:
+def document_card(doc: DocumentSummary) -> rx.Component:
     return rx.el.div(
         rx.el.div(
             rx.icon("file-text", class_name="h-8 w-8 text-indigo-600 mb-4"),
@@ -67,10 +71,11 @@ def document_card(doc: Document) -> rx.Component:
             class_name="mt-auto",
         ),
         class_name="flex flex-col p-5 bg-white rounded-xl border border-gray-200 shadow-sm hover:shadow-md transition-all duration-200",
+        style={"content_visibility": "auto", "contain_intrinsic_size": "auto 220px"},
     )
 
 
-def document_row(doc: Document) -> rx.Component:
+def document_row(doc: DocumentSummary) -> rx.Component:
     return rx.el.tr(
         rx.el.td(
             rx.el.div(
@@ -98,6 +103,60 @@ def document_row(doc: Document) -> rx.Component:
             class_name="px-6 py-4 whitespace-nowrap text-right",
         ),
         class_name="hover:bg-gray-50 transition-colors border-b border-gray-100 last:border-0",
+        style={"content_visibility": "auto", "contain_intrinsic_size": "auto 64px"},
+    )
+
+
+def library_footer() -> rx.Component:
+    return rx.el.div(
+        rx.el.span(
+            f"Showing {DocumentState.documents.length()} of {DocumentState.library_total} documents",
+            class_name="text-sm text-gray-500",
+        ),
+        rx.el.div(
+            rx.cond(
+                DocumentState.library_trimmed,
+                rx.el.button(
+                    "Back to top",
+                    on_click=DocumentState.reload_library,
+                    class_name="px-3 py-1.5 text-sm font-medium text-gray-600 hover:bg-gray-100 rounded-lg",
+                ),
+            ),
+            rx.cond(
+                DocumentState.library_cursor != "",
+                rx.el.button(
+                    "Load more",
+                    on_click=DocumentState.load_more_documents,
+                    class_name="px-3 py-1.5 text-sm font-medium text-indigo-600 hover:bg-indigo-50 rounded-lg",
+                ),
+            ),
+            class_name="flex items-center gap-2",
+        ),
+        class_name="flex items-center justify-between py-6",
+    )
+
+
+def library_controls() -> rx.Component:
+    return rx.el.div(
+        rx.el.select(
+            rx.el.option("Newest first", value="newest"),
+            rx.el.option("Oldest first", value="oldest"),
+            rx.el.option("Title A-Z", value="title"),
+            rx.el.option("Author A-Z", value="author"),
+            value=DocumentState.library_sort,
+            on_change=DocumentState.set_library_sort,
+            class_name="py-2 px-3 text-sm border border-gray-200 rounded-lg bg-white text-gray-700",
+        ),
+        rx.el.select(
+            *[
+                rx.el.option(f"{size} per page", value=str(size))
+                for size in settings.LIBRARY_PAGE_SIZES
+            ],
+            value=DocumentState.library_page_size.to_string(),
+            on_change=DocumentState.set_library_page_size,
+            class_name="py-2 px-3 text-sm border border-gray-200 rounded-lg bg-white text-gray-700",
+        ),
+        class_name="flex items-center gap-2",
     )
 
 
@@ -111,8 +170,10 @@ def library_view() -> rx.Component:
                         class_name="h-5 w-5 text-gray-400 absolute left-3 top-1/2 -translate-y-1/2",
                     ),
                     rx.el.input(
-                        placeholder="Search by title or author...",
-                        on_change=DocumentState.set_search_query,
+                        placeholder="Search by title, author, keyword or entity...",
+                        on_change=DocumentState.set_search_query.debounce(
+                            settings.LIBRARY_FILTER_DEBOUNCE_MS
+                        ),
                         class_name="pl-10 pr-4 py-2 w-full border border-gray-200 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent outline-none transition-all",
                         default_value=DocumentState.search_query,
                     ),
@@ -139,48 +200,57 @@ def library_view() -> rx.Component:
                     ),
                     class_name="flex items-center gap-1 border-l border-gray-200 pl-4 ml-4",
                 ),
+                library_controls(),
                 class_name="flex items-center",
             ),
             class_name="flex flex-col md:flex-row md:items-center justify-between gap-4 mb-8",
         ),
-        rx.cond(
-            DocumentState.view_mode == "grid",
-            rx.el.div(
-                rx.foreach(DocumentState.filtered_documents, document_card),
-                class_name="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6",
-            ),
-            rx.el.div(
-                rx.el.table(
-                    rx.el.thead(
-                        rx.el.tr(
-                            rx.el.th(
-                                "Document",
-                                class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
-                            ),
-                            rx.el.th(
-                                "Author",
-                                class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
-                            ),
-                            rx.el.th(
-                                "Uploaded",
-                                class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
-                            ),
-                            rx.el.th(
-                                "Status",
-                                class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
+        rx.el.div(
+            rx.cond(
+                DocumentState.view_mode == "grid",
+                rx.el.div(
+                    rx.foreach(DocumentState.documents, document_card),
+                    class_name="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6",
+                ),
+                rx.el.div(
+                    rx.el.table(
+                        rx.el.thead(
+                            rx.el.tr(
+                                rx.el.th(
+                                    "Document",
+                                    class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
+                                ),
+                                rx.el.th(
+                                    "Author",
+                                    class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
+                                ),
+                                rx.el.th(
+                                    "Uploaded",
+                                    class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
+                                ),
+                                rx.el.th(
+                                    "Status",
+                                    class_name="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider",
+                                ),
+                                rx.el.th("", class_name="px-6 py-3 relative"),
                             ),
-                            rx.el.th("", class_name="px-6 py-3 relative"),
+                            class_name="bg-gray-50",
                         ),
-                        class_name="bg-gray-50",
-                    ),
-                    rx.el.tbody(
-                        rx.foreach(DocumentState.filtered_documents, document_row),
-                        class_name="bg-white divide-y divide-gray-200",
+                        rx.el.tbody(
+                            rx.foreach(DocumentState.documents, document_row),
+                            class_name="bg-white divide-y divide-gray-200",
+                        ),
+                        class_name="min-w-full divide-y divide-gray-200",
                     ),
-                    class_name="min-w-full divide-y divide-gray-200",
+                    class_name="overflow-hidden shadow ring-1 ring-black ring-opacity-5 rounded-lg",
                 ),
-                class_name="overflow-hidden shadow ring-1 ring-black ring-opacity-5 rounded-lg",
             ),
+            library_footer(),
+            id=LIBRARY_SCROLL_ID,
+            on_scroll=DocumentState.on_library_scroll(
+                scroll_remaining(LIBRARY_SCROLL_ID)
+            ).throttle(200),
+            class_name="overflow-y-auto max-h-[calc(100vh-14rem)]",
         ),
         class_name="p-4 md:p-8 w-full",
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,9 @@
+import reflex as rx
+
+
+def scroll_remaining(element_id: str) -> rx.Var:
+    """Distance in pixels between the bottom of an element's viewport and its end."""
+    return rx.Var(
+        f"(() => {{ const el = document.getElementById('{element_id}'); "
+        "return el ? el.scrollHeight - el.scrollTop - el.clientHeight : 0; })()"
+    ).to(float)
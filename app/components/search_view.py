@@ -1,8 +1,11 @@
 import reflex as rx
-from app.states.document_state import DocumentState, Document
+from app.services.pipeline import ENTITY_LABELS
+from app.states.document_state import DocumentState, SearchHit
 
+FILTER_INPUT_CLASS = "py-2 px-3 text-sm border border-gray-200 rounded-lg bg-white text-gray-700 outline-none focus:border-indigo-500"
 
-def search_result_card(doc: Document) -> rx.Component:
+
+def search_result_card(doc: SearchHit) -> rx.Component:
     return rx.el.div(
         rx.el.div(
             rx.el.div(
@@ -22,12 +25,19 @@ def search_result_card(doc: Document) -> rx.Component:
                 class_name="text-sm text-gray-500 mb-3",
             ),
             rx.el.p(
-                doc["extracted_text"][:250] + "...",
+                rx.cond(
+                    doc["snippet_page"] > 0,
+                    rx.el.span(
+                        f"p. {doc['snippet_page']} ",
+                        class_name="text-xs font-semibold text-gray-400 mr-1",
+                    ),
+                ),
+                doc["snippet"],
                 class_name="text-sm text-gray-600 leading-relaxed mb-3 line-clamp-3",
             ),
             rx.el.div(
                 rx.foreach(
-                    doc["keywords"][:4],
+                    doc["keywords"],
                     lambda k: rx.el.span(
                         f"#{k}",
                         class_name="text-xs text-indigo-500 bg-indigo-50 px-2 py-1 rounded-md font-medium",
@@ -41,6 +51,34 @@ def search_result_card(doc: Document) -> rx.Component:
     )
 
 
+def filter_input(name: str, placeholder: str) -> rx.Component:
+    return rx.el.input(
+        placeholder=placeholder,
+        on_change=lambda value: DocumentState.set_search_filter(name, value).debounce(
+            300
+        ),
+        class_name=FILTER_INPUT_CLASS,
+    )
+
+
+def search_filters() -> rx.Component:
+    return rx.el.div(
+        filter_input("author", "Author"),
+        filter_input("year", "Year"),
+        filter_input("keyword", "Keyword"),
+        filter_input("entity_text", "Entity"),
+        rx.el.select(
+            rx.el.option("Any entity type", value=""),
+            *[rx.el.option(label, value=label) for label in ENTITY_LABELS],
+            on_change=lambda value: DocumentState.set_search_filter(
+                "entity_label", value
+            ),
+            class_name=FILTER_INPUT_CLASS,
+        ),
+        class_name="flex flex-wrap gap-2 max-w-4xl mx-auto mt-4",
+    )
+
+
 def search_view() -> rx.Component:
     return rx.el.div(
         rx.el.div(
@@ -70,6 +108,7 @@ def search_view() -> rx.Component:
                     ),
                     class_name="relative w-full max-w-4xl mx-auto",
                 ),
+                search_filters(),
                 class_name="w-full mb-12",
             ),
             rx.cond(
@@ -102,4 +141,4 @@ def search_view() -> rx.Component:
             class_name="flex flex-col w-full max-w-6xl mx-auto",
         ),
         class_name="p-4 md:p-8 w-full min-h-full",
-    )
\ No newline at end of file
+    )
@@ -1,5 +1,22 @@
 import reflex as rx
-from app.states.document_state import DocumentState
+from app.states.document_state import DocumentState, UploadProgress
+
+
+def upload_progress_row(progress: UploadProgress) -> rx.Component:
+    return rx.el.div(
+        rx.match(
+            progress["status"],
+            ("uploaded", rx.icon("circle-check", class_name="h-4 w-4 text-green-500")),
+            ("duplicate", rx.icon("copy", class_name="h-4 w-4 text-gray-400")),
+            ("rejected", rx.icon("circle-x", class_name="h-4 w-4 text-red-500")),
+            rx.icon("loader-circle", class_name="h-4 w-4 text-indigo-500 animate-spin"),
+        ),
+        rx.el.span(
+            progress["name"], class_name="text-sm text-gray-600 truncate flex-1"
+        ),
+        rx.el.span(progress["detail"], class_name="text-xs text-gray-500"),
+        class_name="flex items-center gap-2 p-2 bg-white border border-gray-200 rounded-lg shadow-sm",
+    )
 
 
 def upload_area() -> rx.Component:
@@ -59,6 +76,17 @@ def upload_area() -> rx.Component:
                     ),
                     class_name="flex flex-col gap-2",
                 ),
+                rx.cond(
+                    DocumentState.upload_progress.length() > 0,
+                    rx.el.div(
+                        rx.el.h4(
+                            "Upload Progress:",
+                            class_name="text-sm font-semibold text-gray-700 mb-2",
+                        ),
+                        rx.foreach(DocumentState.upload_progress, upload_progress_row),
+                        class_name="flex flex-col gap-2 mt-4",
+                    ),
+                ),
                 class_name="mt-6 p-4 bg-gray-50 rounded-xl border border-gray-200 min-h-[100px]",
             ),
             rx.el.div(
@@ -79,7 +107,7 @@ def upload_area() -> rx.Component:
                         ),
                     ),
                     on_click=DocumentState.handle_upload(
-                        rx.upload_files(upload_id=upload_id)
+                        rx.upload_files_chunk(upload_id=upload_id)
                     ),
                     disabled=DocumentState.is_uploading,
                     class_name="px-6 py-2 text-sm font-medium text-white bg-indigo-600 rounded-lg hover:bg-indigo-700 transition-colors shadow-sm disabled:opacity-50 disabled:cursor-not-allowed ml-auto",
@@ -89,4 +117,4 @@ def upload_area() -> rx.Component:
             class_name="bg-white p-8 rounded-2xl shadow-sm border border-gray-200 max-w-3xl mx-auto",
         ),
         class_name="p-4 md:p-8 w-full",
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import threading
+
+from app.services import settings
+
+
+class Checkpoint:
+    """Saves changed indexes on a timer instead of after every document.
+
+    Saving an index rewrites its whole file, so indexing a document only
+    marks the stores it changed. `run` saves them at most every `interval`
+    seconds off the event loop, and `flush` saves the rest when the server
+    stops. Documents indexed after the last checkpoint of a server that
+    crashed are indexed again on startup.
+    """
+
+    def __init__(self, interval: float = settings.CHECKPOINT_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Held while saving, so a flush at shutdown waits for a running one.
+        self._saving = threading.Lock()
+        self._dirty: list = []
+
+    def mark(self, *stores) -> None:
+        """Records stores (anything with a `save()` method) as changed."""
+        with self._lock:
+            for store in stores:
+                if not any(store is dirty for dirty in self._dirty):
+                    self._dirty.append(store)
+
+    def flush(self) -> int:
+        """Saves every changed store now and returns how many were saved."""
+        with self._saving:
+            with self._lock:
+                stores, self._dirty = self._dirty, []
+            saved = 0
+            for store in stores:
+                try:
+                    store.save()
+                    saved += 1
+                except Exception as e:
+                    logging.exception(f"Checkpoint Error: {e}")
+                    self.mark(store)
+            return saved
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._dirty:
+                await asyncio.to_thread(self.flush)
+
+
+checkpoint = Checkpoint()
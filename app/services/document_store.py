@@ -0,0 +1,696 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from app.services import settings
+from app.services.keyword_index import tokenize
+from app.services.records import (
+    Document,
+    DocumentPage,
+    DocumentSummary,
+    Passage,
+    SearchHit,
+)
+
+SUMMARY_COLUMNS = (
+    "id",
+    "title",
+    "author",
+    "upload_date",
+    "status",
+    "pipeline_stage",
+    "stage_detail",
+)
+JSON_COLUMNS = ("keywords", "entities")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    upload_date TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pipeline_stage INTEGER NOT NULL DEFAULT 0,
+    extracted_text TEXT NOT NULL DEFAULT '',
+    keywords TEXT NOT NULL DEFAULT '[]',
+    entities TEXT NOT NULL DEFAULT '[]',
+    embedding BLOB,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_status ON documents (status);
+CREATE INDEX IF NOT EXISTS documents_created_at ON documents (created_at);
+CREATE TABLE IF NOT EXISTS document_pages (
+    doc_id TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (doc_id, page_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pipeline_cache (
+    file_hash TEXT NOT NULL,
+    pipeline_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    embedding BLOB,
+    pages BLOB NOT NULL,
+    PRIMARY KEY (file_hash, pipeline_version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS passages (
+    doc_id TEXT NOT NULL,
+    passage_no INTEGER NOT NULL,
+    page_no INTEGER NOT NULL,
+    char_offset INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (doc_id, passage_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS status_counts (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS documents_count_insert AFTER INSERT ON documents
+BEGIN
+    INSERT INTO status_counts (status, count) VALUES (NEW.status, 1)
+    ON CONFLICT (status) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS documents_count_delete AFTER DELETE ON documents
+BEGIN
+    UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+END;
+CREATE TRIGGER IF NOT EXISTS documents_count_update
+AFTER UPDATE OF status ON documents WHEN OLD.status <> NEW.status
+BEGIN
+    UPDATE status_counts SET count = count - 1 WHERE status = OLD.status;
+    INSERT INTO status_counts (status, count) VALUES (NEW.status, 1)
+    ON CONFLICT (status) DO UPDATE SET count = count + 1;
+END;
+-- The library filter's words: keywords and entity texts are decoded from
+-- their JSON, so the table holds no content and is kept by the triggers.
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    title, author, keywords, entities,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents
+BEGIN
+    INSERT INTO documents_fts (rowid, title, author, keywords, entities)
+    VALUES (
+        NEW.rowid, NEW.title, NEW.author,
+        (SELECT group_concat(value, ' ') FROM json_each(NEW.keywords)),
+        (SELECT group_concat(json_extract(value, '$.text'), ' ')
+         FROM json_each(NEW.entities))
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents
+BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, author, keywords, entities)
+    VALUES (
+        'delete', OLD.rowid, OLD.title, OLD.author,
+        (SELECT group_concat(value, ' ') FROM json_each(OLD.keywords)),
+        (SELECT group_concat(json_extract(value, '$.text'), ' ')
+         FROM json_each(OLD.entities))
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS documents_fts_update
+AFTER UPDATE OF title, author, keywords, entities ON documents
+BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, author, keywords, entities)
+    VALUES (
+        'delete', OLD.rowid, OLD.title, OLD.author,
+        (SELECT group_concat(value, ' ') FROM json_each(OLD.keywords)),
+        (SELECT group_concat(json_extract(value, '$.text'), ' ')
+         FROM json_each(OLD.entities))
+    );
+    INSERT INTO documents_fts (rowid, title, author, keywords, entities)
+    VALUES (
+        NEW.rowid, NEW.title, NEW.author,
+        (SELECT group_concat(value, ' ') FROM json_each(NEW.keywords)),
+        (SELECT group_concat(json_extract(value, '$.text'), ' ')
+         FROM json_each(NEW.entities))
+    );
+END;
+CREATE TABLE IF NOT EXISTS ocr_cache (
+    page_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Columns added after the initial schema, applied to existing databases.
+COLUMN_MIGRATIONS = [
+    ("documents", "page_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("documents", "stage_detail", "TEXT NOT NULL DEFAULT ''"),
+    ("documents", "file_hash", "TEXT NOT NULL DEFAULT ''"),
+]
+# Refills the library filter's full-text table from the documents.
+FTS_REBUILD = [
+    "INSERT INTO documents_fts (documents_fts) VALUES ('delete-all')",
+    "INSERT INTO documents_fts (rowid, title, author, keywords, entities) "
+    "SELECT rowid, title, author, "
+    "(SELECT group_concat(value, ' ') FROM json_each(keywords)), "
+    "(SELECT group_concat(json_extract(value, '$.text'), ' ') "
+    "FROM json_each(entities)) FROM documents",
+]
+# Databases from before keywords and entities were in the full-text table.
+FTS_DROP = """
+DROP TRIGGER IF EXISTS documents_fts_insert;
+DROP TRIGGER IF EXISTS documents_fts_delete;
+DROP TRIGGER IF EXISTS documents_fts_update;
+DROP TABLE IF EXISTS documents_fts;
+"""
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS documents_file_hash ON documents (file_hash)",
+    "CREATE INDEX IF NOT EXISTS documents_created_id ON documents (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS documents_title_id "
+    "ON documents (title COLLATE NOCASE, id)",
+    "CREATE INDEX IF NOT EXISTS documents_author_id "
+    "ON documents (author COLLATE NOCASE, id)",
+]
+# Library sort orders: (sort key expression, direction). Pages are fetched by
+# keyset on (sort key, id), so every order needs a matching index above.
+SORT_ORDERS = {
+    "newest": ("created_at", "DESC"),
+    "oldest": ("created_at", "ASC"),
+    "title": ("title COLLATE NOCASE", "ASC"),
+    "author": ("author COLLATE NOCASE", "ASC"),
+}
+# (doc_id, passage_no) keys looked up per query, within SQLite's variable limit.
+KEY_BATCH = 10000
+FTS_TOKEN_RE = re.compile(r"\w+")
+# Search facet conditions, for filtering before the facet index has loaded.
+# words() tokenizes like the index, as " word word ".
+FACET_CONDITIONS = {
+    "year": "substr(upload_date, 1, 4) = ?",
+    "status": "status = ?",
+    "author": "instr(words(author), ' ' || ? || ' ') > 0",
+    "keyword": "instr(words((SELECT group_concat(value, ' ') "
+    "FROM json_each(keywords))), ' ' || ? || ' ') > 0",
+    "entity_text": "instr(words((SELECT group_concat(json_extract(value, '$.text'), ' ') "
+    "FROM json_each(entities))), ' ' || ? || ' ') > 0",
+    "entity_label": "EXISTS (SELECT 1 FROM json_each(entities) "
+    "WHERE json_extract(value, '$.label') = ?)",
+}
+
+
+def _words(text: str | None) -> str:
+    return f" {' '.join(tokenize(text or ''))} "
+
+
+class DocumentStore:
+    """SQLite-backed storage for documents and their pipeline outputs.
+
+    Reflex state only holds summary projections of the rows; full text,
+    keywords and entities are read on demand. Document embeddings live in
+    the embedding matrix; the `embedding` column is only read to migrate
+    databases that predate it.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.create_function("words", 1, _words, deterministic=True)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        fts = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'documents_fts'"
+        ).fetchone()
+        has_fts = fts is not None and "keywords" in fts["sql"]
+        if fts is not None and not has_fts:
+            self._conn.executescript(FTS_DROP)
+        self._conn.executescript(SCHEMA)
+        self._migrate(rebuild_fts=not has_fts)
+
+    def _migrate(self, rebuild_fts: bool = False) -> None:
+        with self._lock, self._conn:
+            for table, column, ddl in COLUMN_MIGRATIONS:
+                existing = {
+                    row["name"]
+                    for row in self._conn.execute(f"PRAGMA table_info({table})")
+                }
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            for ddl in INDEXES:
+                self._conn.execute(ddl)
+            # The full-text index follows documents' rowids, so it is
+            # rebuilt when first created (and must be after a VACUUM).
+            if rebuild_fts:
+                for sql in FTS_REBUILD:
+                    self._conn.execute(sql)
+            # Databases created before the status counters get them backfilled.
+            counted = self._conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM status_counts"
+            ).fetchone()[0]
+            if (
+                counted
+                != self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            ):
+                self._conn.execute("DELETE FROM status_counts")
+                self._conn.execute(
+                    "INSERT INTO status_counts (status, count) "
+                    "SELECT status, COUNT(*) FROM documents GROUP BY status"
+                )
+
+    def _encode(self, fields: dict) -> dict:
+        encoded = dict(fields)
+        for column in JSON_COLUMNS:
+            if column in encoded:
+                encoded[column] = json.dumps(encoded[column])
+        return encoded
+
+    def _decode(self, row: sqlite3.Row) -> Document:
+        doc = dict(row)
+        for column in JSON_COLUMNS:
+            doc[column] = json.loads(doc[column])
+        doc.pop("embedding", None)
+        doc.pop("created_at", None)
+        return doc
+
+    def insert(self, doc: Document) -> None:
+        fields = self._encode(doc)
+        fields.setdefault("created_at", time.time())
+        columns = ", ".join(fields)
+        placeholders = ", ".join(f":{c}" for c in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO documents ({columns}) VALUES ({placeholders})", fields
+            )
+
+    def update(self, doc_id: str, **fields) -> None:
+        if not fields:
+            return
+        fields = self._encode(fields)
+        assignments = ", ".join(f"{c} = :{c}" for c in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE documents SET {assignments} WHERE id = :doc_id",
+                {**fields, "doc_id": doc_id},
+            )
+
+    def legacy_embeddings(self) -> list[tuple[str, np.ndarray]]:
+        """Returns embeddings stored in rows before the embedding matrix existed."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM documents WHERE embedding IS NOT NULL"
+            ).fetchall()
+        return [
+            (row["id"], np.frombuffer(row["embedding"], dtype="float32"))
+            for row in rows
+        ]
+
+    def clear_legacy_embeddings(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE documents SET embedding = NULL WHERE embedding IS NOT NULL"
+            )
+
+    def add_pages(self, doc_id: str, pages: list[tuple[int, str]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO document_pages (doc_id, page_no, text) "
+                "VALUES (?, ?, ?)",
+                [(doc_id, page_no, text) for page_no, text in pages],
+            )
+
+    def delete_pages(self, doc_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM document_pages WHERE doc_id = ?", (doc_id,))
+
+    def add_passages(self, doc_id: str, passages: list[Passage], embeddings) -> None:
+        embeddings = np.asarray(embeddings, dtype="float32")
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO passages "
+                "(doc_id, passage_no, page_no, char_offset, text, embedding) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        doc_id,
+                        passage["passage_no"],
+                        passage["page_no"],
+                        passage["char_offset"],
+                        passage["text"],
+                        embedding.tobytes(),
+                    )
+                    for passage, embedding in zip(passages, embeddings)
+                ],
+            )
+
+    def delete_passages(self, doc_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+
+    def count_passages(self, doc_id: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM passages WHERE doc_id = ?", (doc_id,)
+            ).fetchone()[0]
+
+    def passage_embeddings(self, doc_id: str) -> tuple[list[int], np.ndarray]:
+        """Returns a document's passage numbers and their embedding matrix."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT passage_no, embedding FROM passages WHERE doc_id = ? "
+                "ORDER BY passage_no",
+                (doc_id,),
+            ).fetchall()
+        if not rows:
+            return [], np.zeros((0, settings.EMBEDDING_DIM), dtype="float32")
+        return [row["passage_no"] for row in rows], np.vstack(
+            [np.frombuffer(row["embedding"], dtype="float32") for row in rows]
+        )
+
+    def passage_vectors(self, keys: list[tuple[str, int]]) -> np.ndarray:
+        """Returns the embeddings of (doc_id, passage_no) keys in order.
+
+        Keys with no stored passage get a row of NaNs.
+        """
+        vectors = np.full((len(keys), settings.EMBEDDING_DIM), np.nan, dtype="float32")
+        rows = {key: i for i, key in enumerate(keys)}
+        for start in range(0, len(keys), KEY_BATCH):
+            batch = keys[start : start + KEY_BATCH]
+            placeholders = ", ".join("(?, ?)" for _ in batch)
+            with self._lock:
+                found = self._conn.execute(
+                    "SELECT doc_id, passage_no, embedding FROM passages "
+                    f"WHERE (doc_id, passage_no) IN (VALUES {placeholders})",
+                    [value for key in batch for value in key],
+                ).fetchall()
+            for row in found:
+                vectors[rows[row["doc_id"], row["passage_no"]]] = np.frombuffer(
+                    row["embedding"], dtype="float32"
+                )
+        return vectors
+
+    def get_passages(self, keys) -> dict[tuple[str, int], Passage]:
+        """Returns the passages for (doc_id, passage_no) keys, without embeddings."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ", ".join("(?, ?)" for _ in keys)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, passage_no, page_no, char_offset, text FROM passages "
+                f"WHERE (doc_id, passage_no) IN (VALUES {placeholders})",
+                [value for key in keys for value in key],
+            ).fetchall()
+        return {
+            (row["doc_id"], row["passage_no"]): {
+                "passage_no": row["passage_no"],
+                "page_no": row["page_no"],
+                "char_offset": row["char_offset"],
+                "text": row["text"],
+            }
+            for row in rows
+        }
+
+    def get_cached_result(self, file_hash: str, pipeline_version: str) -> dict | None:
+        """Returns the cached pipeline outputs for a file, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, embedding, pages FROM pipeline_cache "
+                "WHERE file_hash = ? AND pipeline_version = ?",
+                (file_hash, pipeline_version),
+            ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row["result"])
+        result["embedding"] = (
+            np.frombuffer(row["embedding"], dtype="float32")
+            if row["embedding"]
+            else np.zeros(settings.EMBEDDING_DIM, dtype="float32")
+        )
+        result["pages"] = [
+            tuple(page) for page in json.loads(zlib.decompress(row["pages"]))
+        ]
+        return result
+
+    def put_cached_result(
+        self, file_hash: str, pipeline_version: str, doc_id: str, result: dict
+    ) -> None:
+        """Caches a document's pipeline outputs, including its stored pages."""
+        result = dict(result)
+        embedding = result.pop("embedding", [])
+        with self._lock:
+            pages = self._conn.execute(
+                "SELECT page_no, text FROM document_pages WHERE doc_id = ? "
+                "ORDER BY page_no",
+                (doc_id,),
+            ).fetchall()
+        pages_blob = zlib.compress(json.dumps([tuple(page) for page in pages]).encode())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pipeline_cache "
+                "(file_hash, pipeline_version, result, embedding, pages) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    file_hash,
+                    pipeline_version,
+                    json.dumps(result),
+                    np.asarray(embedding, dtype="float32").tobytes()
+                    if len(embedding)
+                    else None,
+                    pages_blob,
+                ),
+            )
+
+    def get_ocr_text(self, page_hash: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM ocr_cache WHERE page_hash = ?", (page_hash,)
+            ).fetchone()
+        return row["text"] if row else None
+
+    def put_ocr_text(self, page_hash: str, text: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (page_hash, text) VALUES (?, ?)",
+                (page_hash, text),
+            )
+
+    def pages_after(
+        self, doc_id: str, after: int = 0, limit: int = settings.PAGE_BATCH_SIZE
+    ) -> list[DocumentPage]:
+        """Returns up to `limit` pages numbered after `after`, in order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_no, text FROM document_pages "
+                "WHERE doc_id = ? AND page_no > ? ORDER BY page_no LIMIT ?",
+                (doc_id, after, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_pages(self, doc_id: str, batch_size: int = settings.PAGE_BATCH_SIZE):
+        """Yields (page_no, text) for every page in order, reading a batch at a time."""
+        last_page = 0
+        while pages := self.pages_after(doc_id, last_page, batch_size):
+            for page in pages:
+                yield page["page_no"], page["text"]
+            last_page = pages[-1]["page_no"]
+
+    def iter_page_texts(self, doc_id: str, batch_size: int = settings.PAGE_BATCH_SIZE):
+        """Yields the text of every page in order, reading a batch at a time."""
+        for _, text in self.iter_pages(doc_id, batch_size):
+            yield text
+
+    def get(self, doc_id: str) -> Document | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def get_many(self, doc_ids, status: str | None = None) -> dict[str, Document]:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        placeholders = ", ".join("?" * len(doc_ids))
+        sql = f"SELECT * FROM documents WHERE id IN ({placeholders})"
+        params = list(doc_ids)
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return {row["id"]: self._decode(row) for row in rows}
+
+    def search_hits(self, doc_ids, status: str | None = None) -> dict[str, SearchHit]:
+        """Returns result cards for documents, with the start of their text as snippet."""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        placeholders = ", ".join("?" * len(doc_ids))
+        sql = (
+            "SELECT id, title, author, upload_date, keywords, "
+            "substr(extracted_text, 1, ?) AS preview "
+            f"FROM documents WHERE id IN ({placeholders})"
+        )
+        params = [settings.SNIPPET_CHARS + 1, *doc_ids]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return {
+            row["id"]: {
+                "id": row["id"],
+                "title": row["title"],
+                "author": row["author"],
+                "upload_date": row["upload_date"],
+                "score": 0.0,
+                "snippet": row["preview"],
+                "snippet_page": 0,
+                "keywords": json.loads(row["keywords"])[: settings.SEARCH_HIT_KEYWORDS],
+            }
+            for row in rows
+        }
+
+    def ids(self, status: str | None = None) -> list[str]:
+        sql = "SELECT id FROM documents"
+        params: list = []
+        if status is not None:
+            sql += " WHERE status = ?"
+            params.append(status)
+        with self._lock:
+            return [row["id"] for row in self._conn.execute(sql, params)]
+
+    @staticmethod
+    def _filter(query: str) -> tuple[str, list]:
+        """Returns a WHERE clause matching word prefixes like the library index.
+
+        Every word must start some word of the title, author, keywords or
+        entity texts.
+        """
+        tokens = FTS_TOKEN_RE.findall(query)
+        if not tokens:
+            return "", []
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return (
+            "rowid IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)",
+            [match],
+        )
+
+    def summaries(self, doc_ids: list[str]) -> list[DocumentSummary]:
+        """Returns the summaries of `doc_ids` in the given order."""
+        if not doc_ids:
+            return []
+        placeholders = ", ".join("?" * len(doc_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM documents "
+                f"WHERE id IN ({placeholders})",
+                doc_ids,
+            ).fetchall()
+        by_id = {row["id"]: dict(row) for row in rows}
+        return [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+
+    def iter_library_rows(self, doc_id: str | None = None):
+        """Yields the library filter and search facet fields of one or every document."""
+        sql = (
+            "SELECT id, title, author, upload_date, status, keywords, entities, "
+            "created_at FROM documents"
+        )
+        params: list = []
+        if doc_id is not None:
+            sql += " WHERE id = ?"
+            params.append(doc_id)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for row in rows:
+            yield dict(row)
+
+    def facet_ids(self, facets: list[tuple[str, str]]) -> set[str]:
+        """Returns the ids of the documents that have every (name, value) facet."""
+        where = " AND ".join(FACET_CONDITIONS[name] for name, _ in facets)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM documents WHERE {where}",
+                [value for _, value in facets],
+            ).fetchall()
+        return {row["id"] for row in rows}
+
+    def list_summaries(
+        self,
+        limit: int = settings.LIBRARY_PAGE_SIZE,
+        query: str = "",
+        sort: str = "newest",
+        cursor: str = "",
+    ) -> tuple[list[DocumentSummary], str]:
+        """Returns a page of summaries and the cursor of the next page.
+
+        Pages are read by keyset on the sort key and id, so fetching a page
+        deep into the library costs the same as the first one. The returned
+        cursor is empty on the last page.
+        """
+        key, direction = SORT_ORDERS[sort]
+        conditions: list[str] = []
+        params: list = []
+        where, filter_params = self._filter(query)
+        if where:
+            conditions.append(where)
+            params += filter_params
+        if cursor:
+            comparison = "<" if direction == "DESC" else ">"
+            # The bare key bound lets SQLite seek the index; the row value
+            # comparison alone is not indexable under a collation.
+            sort_value, last_id = json.loads(cursor)
+            conditions.append(
+                f"{key} {comparison}= ? AND ({key}, id) {comparison} (?, ?)"
+            )
+            params += [sort_value, sort_value, last_id]
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)}, {key} AS sort_key FROM documents"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {key} {direction}, id {direction} LIMIT ?"
+        params.append(limit + 1)
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params)]
+        next_cursor = ""
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = json.dumps([rows[-1]["sort_key"], rows[-1]["id"]])
+        for row in rows:
+            del row["sort_key"]
+        return rows, next_cursor
+
+    def status_counts(self) -> dict[str, int]:
+        """Returns the number of documents per status from the maintained counters."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, count FROM status_counts WHERE count > 0"
+            ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def count(self, status: str | None = None, query: str = "") -> int:
+        if not FTS_TOKEN_RE.search(query):
+            counts = self.status_counts()
+            return counts.get(status, 0) if status is not None else sum(counts.values())
+        sql = "SELECT COUNT(*) FROM documents WHERE 1 = 1"
+        params: list = []
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        where, filter_params = self._filter(query)
+        if where:
+            sql += f" AND {where}"
+            params += filter_params
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def seed(self, docs: list[Document]) -> None:
+        """Inserts sample documents into an empty store."""
+        if self.count():
+            return
+        now = time.time()
+        for offset, doc in enumerate(docs):
+            self.insert({**doc, "created_at": now - offset})
+
+
+document_store = DocumentStore(settings.DOCUMENT_STORE_PATH)
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from app.services import settings
+
+DTYPES = ("float32", "float16")
+
+
+class EmbeddingMatrix:
+    """Document embeddings as one contiguous matrix with a row per document.
+
+    The matrix lives in a .npy file that is memory-mapped rather than read,
+    so opening it costs the same for ten documents or a million and rows are
+    paged in when used. `_rows` maps document ids to rows; rows of removed
+    documents are reused, and the file doubles in size when it is full.
+    Rows are stored as float32, or float16 at half the size.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: Path | None = None,
+        dtype: str = "float32",
+        version: str = "",
+        initial_capacity: int = 1024,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(
+                f"Unknown embedding dtype {dtype!r}, expected one of {DTYPES}"
+            )
+        self.dim = dim
+        self.path = path
+        self.dtype = dtype
+        self.version = version
+        self.initial_capacity = initial_capacity
+        self.needs_rebuild = False
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dim), dtype=dtype)
+        self._rows: dict[str, int] = {}
+        self._free: list[int] = []
+        self._end = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def _meta_path(self) -> Path:
+        return self.path.with_suffix(".rows.json")
+
+    def _grow(self) -> None:
+        capacity = max(2 * len(self._matrix), self.initial_capacity)
+        if self.path is None:
+            matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".npy.tmp")
+            matrix = np.lib.format.open_memmap(
+                tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, self.dim)
+            )
+        matrix[: self._end] = self._matrix[: self._end]
+        if self.path is not None:
+            matrix.flush()
+            del matrix
+            os.replace(tmp_path, self.path)
+            matrix = np.load(self.path, mmap_mode="r+")
+        self._matrix = matrix
+
+    def put(self, doc_id: str, embedding) -> None:
+        vector = np.asarray(embedding, dtype="float32").reshape(self.dim)
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    if self._end == len(self._matrix):
+                        self._grow()
+                    row = self._end
+                    self._end += 1
+                self._rows[doc_id] = row
+            self._matrix[row] = vector
+
+    def get(self, doc_id: str) -> np.ndarray | None:
+        """Returns a document's embedding as a read-only float32 vector."""
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                return None
+            vector = self._matrix[row].astype("float32", copy=False)
+        vector.flags.writeable = False
+        return vector
+
+    def get_many(self, doc_ids: list[str]) -> np.ndarray:
+        """Returns a float32 row per document, NaNs for documents not stored."""
+        vectors = np.full((len(doc_ids), self.dim), np.nan, dtype="float32")
+        with self._lock:
+            found = [
+                (i, self._rows[doc_id])
+                for i, doc_id in enumerate(doc_ids)
+                if doc_id in self._rows
+            ]
+            if found:
+                at, rows = zip(*found)
+                vectors[list(at)] = self._matrix[list(rows)]
+        return vectors
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return False
+            self._free.append(row)
+            return True
+
+    def vectors(self) -> tuple[list[str], np.ndarray]:
+        """Returns every document id and a float32 matrix of their embeddings."""
+        with self._lock:
+            doc_ids = list(self._rows)
+            rows = np.fromiter(self._rows.values(), dtype="int64", count=len(doc_ids))
+            return doc_ids, self._matrix[rows].astype("float32", copy=False)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if not isinstance(self._matrix, np.memmap):
+                self._grow()
+            self._matrix.flush()
+            payload = json.dumps(
+                {
+                    "version": self.version,
+                    "dtype": self.dtype,
+                    "dim": self.dim,
+                    "end": self._end,
+                    "rows": self._rows,
+                    "free": self._free,
+                }
+            )
+        tmp_path = self._meta_path().with_suffix(".json.tmp")
+        tmp_path.write_text(payload)
+        os.replace(tmp_path, self._meta_path())
+
+    def load(self) -> None:
+        if self.path is None or not self._meta_path().exists():
+            return
+        try:
+            meta = json.loads(self._meta_path().read_text())
+            matrix = np.load(self.path, mmap_mode="r+")
+        except Exception as e:
+            logging.exception(f"Embedding matrix load error: {e}")
+            self.needs_rebuild = True
+            return
+        if (
+            meta.get("version") != self.version
+            or meta.get("dtype") != self.dtype
+            or matrix.shape[1:] != (self.dim,)
+            or matrix.dtype != np.dtype(self.dtype)
+        ):
+            logging.warning(
+                f"Ignoring embedding matrix at {self.path}: built with "
+                f"{meta.get('version')!r} as {meta.get('dtype')}, "
+                f"expected {self.version!r} as {self.dtype}"
+            )
+            self.needs_rebuild = True
+            return
+        with self._lock:
+            self._matrix = matrix
+            self._rows = meta["rows"]
+            self._free = meta["free"]
+            self._end = meta["end"]
+
+
+embedding_matrix = EmbeddingMatrix(
+    settings.EMBEDDING_DIM,
+    settings.EMBEDDING_MATRIX_PATH,
+    settings.EMBEDDING_STORAGE_DTYPE,
+    version=settings.EMBEDDING_VERSION,
+)
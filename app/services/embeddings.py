@@ -0,0 +1,182 @@
+import threading
+import zlib
+from collections import Counter
+from collections.abc import Iterator
+from functools import lru_cache
+
+import numpy as np
+
+from app.services import settings
+from app.services.keyword_index import tokenize
+
+
+class HashingEmbedder:
+    """Hashed bag-of-words embeddings shared by the pipeline and the query path.
+
+    Tokens are counted in bulk, each distinct token is hashed once with
+    CRC32 (memoized for frequent tokens) and the counts are accumulated into
+    buckets with `np.bincount`.
+    """
+
+    def __init__(
+        self,
+        dim: int = settings.EMBEDDING_DIM,
+        cache_size: int = settings.TOKEN_HASH_CACHE_SIZE,
+    ):
+        self.dim = dim
+        self.bucket = lru_cache(maxsize=cache_size)(self._bucket)
+
+    def _bucket(self, token: str) -> int:
+        return zlib.crc32(token.encode()) % self.dim
+
+    def counts(self, token_counts: Counter) -> np.ndarray:
+        if not token_counts:
+            return np.zeros(self.dim, dtype="float32")
+        buckets = np.fromiter(
+            (self.bucket(token) for token in token_counts),
+            dtype=np.int64,
+            count=len(token_counts),
+        )
+        weights = np.fromiter(
+            token_counts.values(), dtype=np.float64, count=len(token_counts)
+        )
+        return np.bincount(buckets, weights, minlength=self.dim).astype("float32")
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = self.counts(Counter(tokenize(text)))
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        """Embeds each text separately, one row per text."""
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        return np.vstack([self.embed(text) for text in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed(text)
+
+    def load(self):
+        pass
+
+
+class TransformerEmbedder:
+    """Mean-pooled BERT embeddings (BERTimbau by default) for passages and queries.
+
+    Texts are truncated to `max_tokens` tokens and grouped into batches of
+    similar length bounded by `batch_tokens`, so padding stays small, and run
+    under `torch.inference_mode()`. Each text is mean-pooled over its
+    attention mask. torch and transformers are imported on first `load()`.
+    """
+
+    def __init__(
+        self,
+        model_name: str = settings.TRANSFORMER_MODEL,
+        dim: int = settings.EMBEDDING_DIM,
+        max_tokens: int = settings.TRANSFORMER_MAX_TOKENS,
+        batch_tokens: int = settings.TRANSFORMER_BATCH_TOKENS,
+        quantize: bool = settings.TRANSFORMER_QUANTIZE,
+        threads: int = settings.TRANSFORMER_THREADS,
+        query_cache_size: int = settings.QUERY_EMBEDDING_CACHE_SIZE,
+    ):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_tokens = max_tokens
+        self.batch_tokens = max(batch_tokens, max_tokens)
+        self.quantize = quantize
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._torch = None
+        self._tokenizer = None
+        self._model = None
+        self._embed_query = lru_cache(maxsize=query_cache_size)(self._query_vector)
+
+    def load(self):
+        with self._lock:
+            if self._model is not None:
+                return
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+
+            torch.set_num_threads(self.threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModel.from_pretrained(self.model_name).eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            self._torch = torch
+            self._tokenizer = tokenizer
+            self._model = model
+
+    def _batches(self, chunks: list[list[int]]) -> Iterator[list[int]]:
+        """Yields lists of chunk positions, grouped by length to limit padding."""
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]), reverse=True)
+        batch: list[int] = []
+        for i in order:
+            # Chunks arrive longest first, so the first one sets the padded width.
+            width = len(chunks[batch[0]]) if batch else len(chunks[i])
+            if batch and width * (len(batch) + 1) > self.batch_tokens:
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def _pool(self, batch: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the mean-pooled vector and token count of each chunk."""
+        torch = self._torch
+        width = max(len(chunk) for chunk in batch)
+        input_ids = torch.full(
+            (len(batch), width), self._tokenizer.pad_token_id, dtype=torch.long
+        )
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, chunk in enumerate(batch):
+            input_ids[row, : len(chunk)] = torch.tensor(chunk, dtype=torch.long)
+            attention_mask[row, : len(chunk)] = 1
+        with torch.inference_mode():
+            hidden = self._model(
+                input_ids=input_ids, attention_mask=attention_mask
+            ).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            counts = mask.sum(dim=1)
+            pooled = (hidden * mask).sum(dim=1) / counts.clamp(min=1)
+        return pooled.float().numpy(), counts.squeeze(-1).float().numpy()
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        """Embeds short texts (passages) in shared batches, one row per text.
+
+        Texts longer than `max_tokens` are truncated.
+        """
+        self.load()
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        chunks = [
+            self._tokenizer(text, truncation=True, max_length=self.max_tokens)[
+                "input_ids"
+            ]
+            for text in texts
+        ]
+        for batch in self._batches(chunks):
+            pooled, _ = self._pool([chunks[i] for i in batch])
+            vectors[batch] = pooled
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def _query_vector(self, text: str) -> np.ndarray:
+        vec = self.embed_batch([text])[0]
+        vec.setflags(write=False)
+        return vec
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embeds a search query, memoizing repeated queries."""
+        return self._embed_query(text)
+
+
+hashing_embedder = HashingEmbedder()
+
+if settings.EMBEDDING_BACKEND == "bertimbau":
+    embedder = TransformerEmbedder()
+else:
+    embedder = hashing_embedder
@@ -0,0 +1,101 @@
+import json
+
+from app.services.document_store import document_store
+from app.services.keyword_index import tokenize
+from app.services.records import SearchFilters
+from app.services.row_index import RowIndex
+
+# Facets matched word by word (every filter word must appear in the field);
+# the others are matched on their exact value.
+WORD_FACETS = ("author", "keyword", "entity_text")
+VALUE_FACETS = ("year", "entity_label", "status")
+
+
+class FacetIndex(RowIndex):
+    """Sets of document ids per metadata value, for filtering search results.
+
+    A filter resolves to the intersection of the posting sets of its
+    values, smallest first, before any scoring, so the vector and keyword
+    retrievers only ever score the selected documents. Until the index has
+    loaded, filters are evaluated in SQL instead.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._postings: dict[tuple[str, str], set[str]] = {}
+        self._facets: dict[str, frozenset[tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._facets)
+
+    @staticmethod
+    def _row_facets(row: dict) -> frozenset[tuple[str, str]]:
+        keywords = json.loads(row["keywords"])
+        entities = json.loads(row["entities"])
+        facets = {
+            ("year", row["upload_date"][:4]),
+            ("status", row["status"]),
+            *(("author", word) for word in tokenize(row["author"])),
+            *(("keyword", word) for word in tokenize(" ".join(keywords))),
+            *(("entity_label", entity["label"]) for entity in entities),
+            *(
+                ("entity_text", word)
+                for word in tokenize(" ".join(e["text"] for e in entities))
+            ),
+        }
+        return frozenset(facets)
+
+    def _put(self, row: dict) -> None:
+        self.remove(row["id"])
+        facets = self._row_facets(row)
+        self._facets[row["id"]] = facets
+        for facet in facets:
+            self._postings.setdefault(facet, set()).add(row["id"])
+
+    def _build(self, rows):
+        postings: dict[tuple[str, str], set[str]] = {}
+        facets: dict[str, frozenset[tuple[str, str]]] = {}
+        for row in rows:
+            facets[row["id"]] = self._row_facets(row)
+            for facet in facets[row["id"]]:
+                postings.setdefault(facet, set()).add(row["id"])
+        return postings, facets
+
+    def _swap(self, built) -> None:
+        self._postings, self._facets = built
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            for facet in self._facets.pop(doc_id, ()):
+                posting = self._postings[facet]
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[facet]
+
+    def select(self, filters: SearchFilters) -> set[str] | None:
+        """Returns the ids of the documents matching every filter.
+
+        Returns None when no filter is set, meaning every document.
+        """
+        facets = []
+        for name, value in filters.items():
+            if not value:
+                continue
+            if name in WORD_FACETS:
+                facets.extend((name, word) for word in tokenize(value))
+            elif name in VALUE_FACETS:
+                facets.append((name, value.strip()))
+            else:
+                raise ValueError(f"Unknown search filter {name!r}")
+        if not facets:
+            return None
+        if not self.ready:
+            return document_store.facet_ids(facets)
+        with self._lock:
+            postings = sorted(
+                (self._postings.get(facet, set()) for facet in facets), key=len
+            )
+            return postings[0].intersection(*postings[1:])
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,73 @@
+"""Fusion of the vector and keyword rankings into one hybrid ranking."""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+from app.services import settings
+
+FUSION_METHODS = ("rrf", "normalized")
+
+
+def saturate(
+    hits: Sequence[tuple[str, float]], midpoint: float = settings.FUSION_BM25_MIDPOINT
+) -> list[tuple[str, float]]:
+    """Maps unbounded BM25 scores to [0, 1) as s / (s + midpoint).
+
+    Unlike dividing by the best score of the query, this keeps a document's
+    score independent of the other hits.
+    """
+    return [(doc_id, score / (score + midpoint)) for doc_id, score in hits]
+
+
+def fuse(
+    rankings: Sequence[Sequence[tuple[str, float]]],
+    weights: Sequence[float],
+    method: str = settings.FUSION_METHOD,
+    rrf_k: int = settings.RRF_K,
+) -> tuple[list[str], np.ndarray]:
+    """Fuses ranked (doc_id, score) lists, best first, into one score per document.
+
+    "rrf" scores a document sum(w / (rrf_k + rank)) over the rankings that
+    contain it, scaled so that ranking first everywhere scores 1.
+    "normalized" is the weighted sum of the scores themselves, which must
+    already be calibrated to [0, 1]. Returns the documents and their scores
+    in no particular order.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(
+            f"Unknown fusion method {method!r}, expected one of {FUSION_METHODS}"
+        )
+    positions: dict[str, int] = {}
+    for ranking in rankings:
+        for doc_id, _ in ranking:
+            positions.setdefault(doc_id, len(positions))
+    scores = np.zeros(len(positions), dtype="float64")
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        rows = np.fromiter(
+            (positions[doc_id] for doc_id, _ in ranking),
+            dtype="int64",
+            count=len(ranking),
+        )
+        if method == "rrf":
+            scores[rows] += weight / (rrf_k + np.arange(1, len(ranking) + 1))
+        else:
+            scores[rows] += weight * np.fromiter(
+                (score for _, score in ranking), dtype="float64", count=len(ranking)
+            )
+    if method == "rrf" and len(scores) and sum(weights) > 0:
+        scores *= (rrf_k + 1) / sum(weights)
+    return list(positions), scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the indices of the k best scores, best first."""
+    if k <= 0:
+        return np.zeros(0, dtype="int64")
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
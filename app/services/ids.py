@@ -0,0 +1,7 @@
+import hashlib
+
+
+def doc_label(doc_id: str) -> int:
+    """Maps a document id to the stable non-negative int64 label used by the indexes."""
+    digest = hashlib.blake2b(doc_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
@@ -0,0 +1,173 @@
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.services import model_registry, settings
+
+
+class StageTimeout(TimeoutError):
+    pass
+
+
+class IngestionEngine:
+    """Worker pools that run pipeline stages for several documents at once.
+
+    CPU-bound NLP stages run in a process pool and I/O-heavy ones (PDF
+    reading, index writes) in a thread pool, so the event loop only awaits
+    them. `run` pulls document ids from a source through a bounded queue, so
+    the feeder waits whenever `max_pending` documents are already handed to
+    the workers. At most `workers` documents are in flight across all runs,
+    and each can be cancelled by id.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.INGEST_WORKERS,
+        max_pending: int = settings.INGEST_MAX_PENDING,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+        self._threads: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        # Free workers per pool, keyed by `in_thread`.
+        self._stage_slots: dict[bool, asyncio.Semaphore] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.model_metrics: dict[int, dict[str, float]] = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=model_registry.warm_up,
+            )
+        return self._executor
+
+    @property
+    def threads(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="ingestion"
+            )
+        return self._threads
+
+    def warm_up(self) -> list[Future]:
+        """Starts every worker so each loads its models before the first upload."""
+        futures = [
+            self.executor.submit(model_registry.warm_up) for _ in range(self.workers)
+        ]
+        for future in futures:
+            future.add_done_callback(self._record_model_metrics)
+        return futures
+
+    def _record_model_metrics(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        metrics = future.result()
+        if metrics["pid"] not in self.model_metrics:
+            logging.info(
+                f"Ingestion worker {metrics['pid']} model load times: "
+                f"{metrics['load_times']}"
+            )
+        self.model_metrics[metrics["pid"]] = metrics["load_times"]
+
+    async def run_stage(
+        self,
+        fn: Callable,
+        *args,
+        timeout: float | None = None,
+        in_thread: bool = False,
+    ):
+        """Runs one pipeline stage in the process pool, or the thread pool.
+
+        Stages wait for a free worker before they are submitted, so `timeout`
+        only counts the stage's own run time. Raises StageTimeout when the
+        stage takes longer than `timeout` seconds. A stage already running in
+        a worker cannot be interrupted, but the document stops waiting for
+        it; its worker is free again once it finishes.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.threads if in_thread else self.executor
+        if in_thread not in self._stage_slots:
+            self._stage_slots[in_thread] = asyncio.Semaphore(self.workers)
+        slots = self._stage_slots[in_thread]
+
+        def release(_):
+            # The loop is closed if the server stopped while the stage ran.
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(slots.release)
+
+        await slots.acquire()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except TimeoutError:
+            raise StageTimeout(
+                f"{fn.__name__} timed out after {timeout:g} seconds"
+            ) from None
+
+    def cancel(self, doc_id: str) -> bool:
+        """Cancels the in-flight processing of a document."""
+        task = self._tasks.get(doc_id)
+        if task is None or task.done():
+            return False
+        return task.cancel()
+
+    async def run(
+        self,
+        next_doc: Callable[[], Awaitable[str | None]],
+        process: Callable[[str], Awaitable[None]],
+    ) -> None:
+        """Processes documents from `next_doc` until it returns None."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=self.max_pending)
+
+        async def feed():
+            try:
+                while (doc_id := await next_doc()) is not None:
+                    await queue.put(doc_id)
+            finally:
+                for _ in range(self.workers):
+                    await queue.put(None)
+
+        async def work():
+            while (doc_id := await queue.get()) is not None:
+                async with self._slots:
+                    task = asyncio.create_task(process(doc_id))
+                    self._tasks[doc_id] = task
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        # Only swallow cancellation of this document, not of the run.
+                        if asyncio.current_task().cancelling():
+                            raise
+                    except Exception as e:
+                        logging.exception(f"Ingestion Error for {doc_id}: {e}")
+                    finally:
+                        self._tasks.pop(doc_id, None)
+
+        await asyncio.gather(feed(), *(work() for _ in range(self.workers)))
+
+    def shutdown(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+
+ingestion_engine = IngestionEngine()
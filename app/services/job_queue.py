@@ -0,0 +1,262 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app.services import settings
+from app.services.records import Job
+
+# Checkpoints, in order: the number of pipeline stages a job has completed.
+STAGE_EXTRACTED = 1
+STAGE_KEYWORDS = 2
+STAGE_ENTITIES = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    doc_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    worker TEXT NOT NULL DEFAULT '',
+    lease_expires REAL NOT NULL DEFAULT 0,
+    client_token TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at);
+"""
+JOB_COLUMNS = "doc_id, status, stage, attempts, client_token, error"
+
+
+class LeaseLost(Exception):
+    """The job was cancelled, or claimed again after its lease expired, while it ran."""
+
+
+class JobQueue:
+    """Durable queue of document processing jobs, one per document.
+
+    A job is "pending" until the server claims it, "running" while the server
+    holds its lease, and "dead" once it has failed `max_attempts` times.
+    Leases are renewed while the server runs. A single server uses the queue
+    (see `server_lock`), so jobs left running by a previous run of it are
+    claimed again on restart and resume from their last checkpointed stage.
+    Finished and cancelled jobs are deleted; dead jobs are kept with their
+    last error.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        lease_seconds: float = settings.JOB_LEASE_SECONDS,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+    ):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        # Set whenever a job is enqueued, to wake the runner.
+        self.added = asyncio.Event()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def enqueue(self, doc_id: str, client_token: str = "") -> None:
+        """Queues a document from its first stage, replacing any previous job."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(doc_id, status, available_at, client_token, created_at) "
+                "VALUES (?, 'pending', ?, ?, ?)",
+                (doc_id, now, client_token, now),
+            )
+        self.added.set()
+
+    def recover(self, doc_ids) -> int:
+        """Queues the documents that have no job, such as those left by older versions."""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (doc_id, status, available_at, created_at) "
+                "VALUES (?, 'pending', ?, ?)",
+                [(doc_id, now, now) for doc_id in doc_ids],
+            )
+        if cursor.rowcount > 0:
+            self.added.set()
+        return cursor.rowcount
+
+    def claim(self) -> Job | None:
+        """Leases the oldest job that is ready to run to this worker.
+
+        Cancelled jobs whose worker stopped are handed out as they are, for
+        the runner to finish cancelling.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "UPDATE jobs SET worker = :worker, "
+                "status = IIF(status = 'cancelled', status, 'running'), "
+                "lease_expires = :expires, attempts = attempts + 1 "
+                "WHERE doc_id = ("
+                "  SELECT doc_id FROM jobs"
+                "  WHERE (status = 'pending' AND available_at <= :now)"
+                "  OR (status IN ('running', 'cancelled') AND lease_expires <= :now)"
+                "  ORDER BY available_at, created_at LIMIT 1"
+                f") RETURNING {JOB_COLUMNS}",
+                {
+                    "worker": self.worker,
+                    "expires": now + self.lease_seconds,
+                    "now": now,
+                },
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def get(self, doc_id: str) -> Job | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def checkpoint(self, doc_id: str, stage: int) -> None:
+        """Records a completed stage and renews the job's lease.
+
+        Raises LeaseLost if this worker no longer holds the job.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET stage = ?, lease_expires = ? "
+                "WHERE doc_id = ? AND status = 'running' AND worker = ?",
+                (stage, time.time() + self.lease_seconds, doc_id, self.worker),
+            )
+        if cursor.rowcount == 0:
+            raise LeaseLost(doc_id)
+
+    def renew(self) -> int:
+        """Extends the leases of every job this worker holds."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE status IN ('running', 'cancelled') AND worker = ?",
+                (time.time() + self.lease_seconds, self.worker),
+            )
+        return cursor.rowcount
+
+    def complete(self, doc_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE doc_id = ? AND worker = ?",
+                (doc_id, self.worker),
+            )
+
+    def fail(self, doc_id: str, error: str) -> float | None:
+        """Records a failed attempt.
+
+        Returns the delay before the job is retried, or None once it has
+        used up its attempts and is dead-lettered. Raises LeaseLost if this
+        worker no longer holds the job.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs "
+                "WHERE doc_id = ? AND status = 'running' AND worker = ?",
+                (doc_id, self.worker),
+            ).fetchone()
+            if row is None:
+                raise LeaseLost(doc_id)
+            if row["attempts"] >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'dead', worker = '', error = ? "
+                    "WHERE doc_id = ?",
+                    (error, doc_id),
+                )
+                return None
+            delay = min(
+                settings.JOB_RETRY_DELAY * 2 ** (row["attempts"] - 1),
+                settings.JOB_RETRY_MAX_DELAY,
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', available_at = ?, worker = '', "
+                "lease_expires = 0, error = ? WHERE doc_id = ?",
+                (now + delay, error, doc_id),
+            )
+        return delay
+
+    def cancel(self, doc_id: str) -> str | None:
+        """Cancels a job, returning its status before, or None if it had none.
+
+        Pending jobs are deleted; running ones are marked "cancelled" for
+        the worker holding them to stop at its next checkpoint.
+        """
+        with self._lock, self._conn:
+            job = self.get(doc_id)
+            if job is None or job["status"] not in ("pending", "running"):
+                return None
+            if job["status"] == "pending":
+                self._conn.execute("DELETE FROM jobs WHERE doc_id = ?", (doc_id,))
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'cancelled' WHERE doc_id = ?", (doc_id,)
+                )
+        return job["status"]
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE doc_id = ?", (doc_id,))
+
+    def release(self) -> int:
+        """Hands this worker's jobs back to the queue when the server stops.
+
+        The interrupted attempts are not counted against the jobs.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'pending', worker = '', lease_expires = 0, "
+                "attempts = MAX(attempts - 1, 0) "
+                "WHERE status = 'running' AND worker = ?",
+                (self.worker,),
+            )
+        return cursor.rowcount
+
+    def expire_stale(self) -> int:
+        """Makes the jobs held by a previous run of the server claimable now.
+
+        Unlike `release()`, the interrupted attempts are counted, since the
+        server may have died processing them. Call only while holding the
+        server lock, when no other process can be running them.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = 0 "
+                "WHERE status IN ('running', 'cancelled') AND worker != ?",
+                (self.worker,),
+            )
+        if cursor.rowcount > 0:
+            self.added.set()
+        return cursor.rowcount
+
+    def dead_letters(self) -> list[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE status = 'dead' "
+                "ORDER BY created_at"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+
+job_queue = JobQueue(settings.JOB_QUEUE_PATH)
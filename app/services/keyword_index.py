@@ -0,0 +1,220 @@
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import Counter
+from collections.abc import Collection
+from pathlib import Path
+
+from app.services import settings
+from app.services.ids import doc_label
+
+TOKEN_RE = re.compile(r"\w+")
+COMBINING_RE = re.compile(r"[\u0300-\u036f]")
+
+
+def normalize(text: str) -> str:
+    """Case-folds text and strips diacritics so "Automática" matches "automatica"."""
+    return COMBINING_RE.sub("", unicodedata.normalize("NFKD", text.casefold()))
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+class KeywordIndex:
+    """Inverted index with BM25 scoring over the extracted text of documents.
+
+    Postings map each term to the term frequency per document label, so a
+    query only touches the postings lists of its own terms. Updates are
+    appended to a journal and folded into the snapshot by `save()`.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        k1: float = settings.BM25_K1,
+        b: float = settings.BM25_B,
+    ):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: dict[str, dict[int, int]] = {}
+        self._doc_lengths: dict[int, int] = {}
+        self._doc_terms: dict[int, tuple[str, ...]] = {}
+        self._total_length = 0
+        self._ids: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_label(doc_id) in self._doc_lengths
+
+    def document_frequency(self, term: str) -> int:
+        return len(self._postings.get(term, ()))
+
+    def add(self, doc_id: str, text: str) -> None:
+        self.add_pages(doc_id, [text])
+
+    def add_pages(self, doc_id: str, texts) -> None:
+        """Indexes a document from an iterable of page texts."""
+        counts = Counter()
+        for text in texts:
+            counts.update(tokenize(text))
+        with self._lock:
+            self._add_counts(doc_id, counts)
+            self._journal(("add", doc_id, counts))
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            removed = self._remove_label(doc_label(doc_id))
+            if removed:
+                self._journal(("remove", doc_id, None))
+            return removed
+
+    def _add_counts(self, doc_id: str, counts: Counter) -> None:
+        label = doc_label(doc_id)
+        self._remove_label(label)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[label] = tf
+        length = sum(counts.values())
+        self._doc_lengths[label] = length
+        self._doc_terms[label] = tuple(counts)
+        self._total_length += length
+        self._ids[label] = doc_id
+
+    def _remove_label(self, label: int) -> bool:
+        length = self._doc_lengths.pop(label, None)
+        if length is None:
+            return False
+        self._total_length -= length
+        del self._ids[label]
+        for term in self._doc_terms.pop(label):
+            del self._postings[term][label]
+            if not self._postings[term]:
+                del self._postings[term]
+        return True
+
+    def score(
+        self, query: str, doc_ids: Collection[str] | None = None
+    ) -> dict[str, float]:
+        """Returns BM25 scores for every document containing a query term.
+
+        With `doc_ids`, only those documents are scored; each term walks
+        whichever is shorter, its postings or the selected documents.
+        """
+        terms = set(tokenize(query))
+        scores: dict[int, float] = {}
+        with self._lock:
+            n = len(self._doc_lengths)
+            if not n or not terms:
+                return {}
+            avg_length = self._total_length / n
+            selected = None
+            if doc_ids is not None:
+                selected = {doc_label(doc_id) for doc_id in doc_ids}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                if selected is None:
+                    matches = postings.items()
+                elif len(selected) < len(postings):
+                    matches = [
+                        (label, postings[label])
+                        for label in selected
+                        if label in postings
+                    ]
+                else:
+                    matches = [
+                        (label, tf)
+                        for label, tf in postings.items()
+                        if label in selected
+                    ]
+                for label, tf in matches:
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._doc_lengths[label] / avg_length
+                    )
+                    scores[label] = scores.get(label, 0.0) + idf * tf * (
+                        self.k1 + 1
+                    ) / (tf + norm)
+            return {self._ids[label]: score for label, score in scores.items()}
+
+    def search(
+        self, query: str, k: int, doc_ids: Collection[str] | None = None
+    ) -> list[tuple[str, float]]:
+        return heapq.nlargest(
+            k, self.score(query, doc_ids).items(), key=lambda item: item[1]
+        )
+
+    def _journal_path(self) -> Path:
+        return self.path.with_suffix(".journal")
+
+    def _journal(self, record: tuple) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._journal_path().open("ab") as f:
+                pickle.dump(record, f)
+        except Exception as e:
+            logging.exception(f"Keyword index journal error: {e}")
+
+    def save(self) -> None:
+        """Writes a snapshot of the index and truncates the update journal."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tmp = self.path.with_suffix(".pkl.tmp")
+            with tmp.open("wb") as f:
+                pickle.dump(
+                    (self._postings, self._doc_lengths, self._doc_terms, self._ids),
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp, self.path)
+            self._journal_path().unlink(missing_ok=True)
+
+    def load(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if self.path.exists():
+                try:
+                    with self.path.open("rb") as f:
+                        postings, doc_lengths, doc_terms, ids = pickle.load(f)
+                except Exception as e:
+                    logging.exception(f"Keyword index load error: {e}")
+                else:
+                    self._postings = postings
+                    self._doc_lengths = doc_lengths
+                    self._doc_terms = doc_terms
+                    self._ids = ids
+                    self._total_length = sum(doc_lengths.values())
+            if self._journal_path().exists():
+                with self._journal_path().open("rb") as f:
+                    while True:
+                        try:
+                            action, doc_id, counts = pickle.load(f)
+                        except EOFError:
+                            break
+                        except Exception as e:
+                            logging.exception(
+                                f"Keyword index journal replay error: {e}"
+                            )
+                            break
+                        if action == "add":
+                            self._add_counts(doc_id, counts)
+                        else:
+                            self._remove_label(doc_label(doc_id))
+
+
+keyword_index = KeywordIndex(settings.KEYWORD_INDEX_PATH)
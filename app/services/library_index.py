@@ -0,0 +1,239 @@
+import bisect
+import functools
+import json
+import string
+from collections import OrderedDict
+
+import numpy as np
+
+from app.services import settings
+from app.services.document_store import SORT_ORDERS
+from app.services.keyword_index import tokenize
+from app.services.row_index import RowIndex
+
+# Sorts after every character a normalized word can contain.
+PREFIX_END = "\U0010ffff"
+# Folds text like SQLite's NOCASE collation, which only folds ASCII letters.
+NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+# Position of each sort order's key in a document's sort values.
+SORT_COLUMNS = {"newest": 0, "oldest": 0, "title": 1, "author": 2}
+
+
+class LibraryIndex(RowIndex):
+    """In-memory word-prefix index for filtering the library as the user types.
+
+    Each document's title, author, keywords and entities are tokenized like
+    the keyword index (case and accent insensitive). A query matches the
+    documents that have, for every query word, some word starting with it;
+    prefixes are looked up as a range of the sorted vocabulary. Recent
+    results are kept by query, so a query that extends a cached one (the
+    usual case while typing) only intersects that smaller result set with
+    the postings of the words that changed. Pages are ordered and resumed
+    like the document store's pages, by sort key and id, so both take the
+    same `[sort value, id]` cursor.
+    """
+
+    def __init__(self, cache_size: int = settings.LIBRARY_FILTER_CACHE_SIZE):
+        super().__init__()
+        self.cache_size = cache_size
+        self._slots: dict[str, int] = {}
+        self._doc_ids: list[str | None] = []
+        self._words: list[frozenset[str]] = []
+        self._sort_values: list[tuple[float, str, str]] = []
+        self._postings: dict[str, set[int]] = {}
+        self._vocab: list[str] = []
+        self._ranks: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._cache: OrderedDict[str, set[int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @staticmethod
+    def _row_words(row: dict) -> frozenset[str]:
+        fields = [
+            row["title"],
+            row["author"],
+            *json.loads(row["keywords"]),
+            *(entity["text"] for entity in json.loads(row["entities"])),
+        ]
+        return frozenset(tokenize(" ".join(fields)))
+
+    def _unlink(self, slot: int) -> None:
+        for word in self._words[slot]:
+            posting = self._postings[word]
+            posting.discard(slot)
+            if not posting:
+                del self._postings[word]
+                del self._vocab[bisect.bisect_left(self._vocab, word)]
+
+    def _put(self, row: dict) -> None:
+        words = self._row_words(row)
+        sort_values = (row["created_at"], row["title"], row["author"])
+        slot = self._slots.get(row["id"])
+        if slot is None:
+            slot = len(self._doc_ids)
+            self._slots[row["id"]] = slot
+            self._doc_ids.append(row["id"])
+            self._words.append(frozenset())
+            self._sort_values.append(sort_values)
+            self._ranks.clear()
+        elif self._sort_values[slot] != sort_values:
+            self._sort_values[slot] = sort_values
+            self._ranks.clear()
+        self._unlink(slot)
+        self._words[slot] = words
+        for word in words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                bisect.insort(self._vocab, word)
+            posting.add(slot)
+        for query, matched in self._cache.items():
+            if self._matches(slot, query.split()):
+                matched.add(slot)
+            else:
+                matched.discard(slot)
+
+    def _build(self, rows) -> "LibraryIndex":
+        built = LibraryIndex(self.cache_size)
+        for row in rows:
+            slot = len(built._doc_ids)
+            words = built._row_words(row)
+            built._slots[row["id"]] = slot
+            built._doc_ids.append(row["id"])
+            built._words.append(words)
+            built._sort_values.append((row["created_at"], row["title"], row["author"]))
+            for word in words:
+                built._postings.setdefault(word, set()).add(slot)
+        built._vocab = sorted(built._postings)
+        return built
+
+    def _swap(self, built: "LibraryIndex") -> None:
+        self._slots = built._slots
+        self._doc_ids = built._doc_ids
+        self._words = built._words
+        self._sort_values = built._sort_values
+        self._postings = built._postings
+        self._vocab = built._vocab
+        self._ranks.clear()
+        self._cache.clear()
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is None:
+                return
+            self._unlink(slot)
+            self._words[slot] = frozenset()
+            self._doc_ids[slot] = None
+            for matched in self._cache.values():
+                matched.discard(slot)
+            self._ranks.clear()
+
+    def _matches(self, slot: int, prefixes: list[str]) -> bool:
+        words = self._words[slot]
+        return all(any(word.startswith(p) for word in words) for p in prefixes)
+
+    def _prefix_slots(self, prefix: str) -> set[int]:
+        lo = bisect.bisect_left(self._vocab, prefix)
+        hi = bisect.bisect_left(self._vocab, prefix + PREFIX_END, lo)
+        return set().union(*(self._postings[word] for word in self._vocab[lo:hi]))
+
+    def match(self, query: str) -> set[int]:
+        """Returns the slots of the documents matching every word prefix of `query`."""
+        words = tokenize(query)
+        key = " ".join(words)
+        with self._lock:
+            if not words:
+                return set(self._slots.values())
+            matched = self._cache.get(key)
+            if matched is not None:
+                self._cache.move_to_end(key)
+                return matched
+            base = max(
+                (cached for cached in self._cache if key.startswith(cached)),
+                key=len,
+                default=None,
+            )
+            if base is None:
+                postings = sorted(map(self._prefix_slots, words), key=len)
+                matched = postings[0].intersection(*postings[1:])
+            else:
+                # Only the last cached word can have grown, plus any new words.
+                matched = self._cache[base]
+                for prefix in words[len(base.split()) - 1 :]:
+                    matched = matched & self._prefix_slots(prefix)
+                    if not matched:
+                        break
+            self._cache[key] = matched
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return matched
+
+    def _sort_key(self, sort: str, slot: int) -> tuple:
+        value = self._sort_values[slot][SORT_COLUMNS[sort]]
+        if isinstance(value, str):
+            value = value.translate(NOCASE)
+        return value, self._doc_ids[slot] or ""
+
+    def _sort_ranks(self, sort: str) -> tuple[np.ndarray, np.ndarray]:
+        """Returns each slot's position in the sort order, and the slots in that order."""
+        cached = self._ranks.get(sort)
+        if cached is None:
+            order = np.array(
+                sorted(
+                    range(len(self._sort_values)),
+                    key=lambda slot: self._sort_key(sort, slot),
+                    reverse=SORT_ORDERS[sort][1] == "DESC",
+                ),
+                dtype="int64",
+            )
+            ranks = np.empty(len(order), dtype="int64")
+            ranks[order] = np.arange(len(order))
+            cached = self._ranks[sort] = (ranks, order)
+        return cached
+
+    def _cursor_rank(self, sort: str, order: np.ndarray, cursor: str) -> int:
+        """Returns the rank of the first slot after a `[sort value, id]` cursor."""
+        value, doc_id = json.loads(cursor)
+        if isinstance(value, str):
+            value = value.translate(NOCASE)
+        key = (value, doc_id)
+        slot_key = functools.partial(self._sort_key, sort)
+        if SORT_ORDERS[sort][1] == "DESC":
+            # Ranks run from the largest key down: skip every key >= the cursor.
+            return len(order) - bisect.bisect_left(order[::-1], key, key=slot_key)
+        return bisect.bisect_right(order, key, key=slot_key)
+
+    def page(
+        self,
+        query: str,
+        limit: int = settings.LIBRARY_PAGE_SIZE,
+        sort: str = "newest",
+        cursor: str = "",
+    ) -> tuple[list[str], str, int]:
+        """Returns a page of matching document ids, the next cursor and the match count."""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order {sort!r}")
+        with self._lock:
+            matched = self.match(query)
+            slots = np.fromiter(matched, dtype="int64", count=len(matched))
+            all_ranks, order = self._sort_ranks(sort)
+            ranks = all_ranks[slots]
+            if cursor:
+                ranks = ranks[ranks >= self._cursor_rank(sort, order, cursor)]
+            if len(ranks) > limit + 1:
+                ranks = np.partition(ranks, limit)[: limit + 1]
+            ranks.sort()
+            page_slots = order[ranks[:limit]]
+            doc_ids = [self._doc_ids[slot] for slot in page_slots]
+            next_cursor = ""
+            if len(ranks) > limit:
+                last = int(page_slots[-1])
+                next_cursor = json.dumps(
+                    [self._sort_values[last][SORT_COLUMNS[sort]], self._doc_ids[last]]
+                )
+            return doc_ids, next_cursor, len(matched)
+
+
+library_index = LibraryIndex()
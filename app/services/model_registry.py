@@ -0,0 +1,91 @@
+import logging
+import os
+import threading
+import time
+
+import spacy
+import yake
+
+from app.services import settings
+from app.services.embeddings import embedder
+
+
+class ModelRegistry:
+    """Loads NLP models once per process and shares them across documents.
+
+    Load durations are kept in `load_times` so warm-up cost can be reported.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keyword_extractors: dict[tuple, yake.KeywordExtractor] = {}
+        self._spacy_pipelines: dict[str, spacy.language.Language] = {}
+        self.load_times: dict[str, float] = {}
+
+    def keyword_extractor(
+        self, lan: str = "pt", n: int = 2, dedup_lim: float = 0.9, top: int = 10
+    ) -> yake.KeywordExtractor:
+        key = (lan, n, dedup_lim, top)
+        with self._lock:
+            extractor = self._keyword_extractors.get(key)
+            if extractor is None:
+                started = time.perf_counter()
+                extractor = yake.KeywordExtractor(
+                    lan=lan, n=n, dedupLim=dedup_lim, top=top, features=None
+                )
+                self.load_times[f"yake:{lan}:{n}:{dedup_lim}:{top}"] = (
+                    time.perf_counter() - started
+                )
+                self._keyword_extractors[key] = extractor
+            return extractor
+
+    def spacy_pipeline(
+        self, name: str = settings.SPACY_MODEL
+    ) -> spacy.language.Language:
+        """Returns the named spaCy pipeline, or a blank Portuguese one if it cannot load."""
+        with self._lock:
+            nlp = self._spacy_pipelines.get(name)
+            if nlp is None:
+                started = time.perf_counter()
+                try:
+                    nlp = spacy.load(name)
+                except Exception as e:
+                    logging.exception(f"Spacy load error: {e}")
+                    nlp = spacy.blank("pt")
+                self.load_times[f"spacy:{name}"] = time.perf_counter() - started
+                self._spacy_pipelines[name] = nlp
+            return nlp
+
+    def embedding_model(self):
+        """Loads the configured embedding backend, if it has a model to load."""
+        if settings.EMBEDDING_BACKEND == "hashing":
+            return embedder
+        key = f"embedder:{settings.EMBEDDING_BACKEND}"
+        if key not in self.load_times:
+            started = time.perf_counter()
+            try:
+                embedder.load()
+            except Exception as e:
+                logging.exception(f"Embedding model load error: {e}")
+                return embedder
+            with self._lock:
+                self.load_times[key] = time.perf_counter() - started
+        return embedder
+
+    def warm_up(self) -> dict:
+        self.keyword_extractor()
+        self.spacy_pipeline()
+        self.embedding_model()
+        return self.metrics()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"pid": os.getpid(), "load_times": dict(self.load_times)}
+
+
+model_registry = ModelRegistry()
+
+
+def warm_up() -> dict:
+    """Process pool initializer and warm-up task for ingestion workers."""
+    return model_registry.warm_up()
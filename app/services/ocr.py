@@ -0,0 +1,43 @@
+import hashlib
+
+import pymupdf
+import pytesseract
+from PIL import Image
+
+from app.services import settings
+from app.services.document_store import document_store
+
+
+def page_fingerprint(doc: pymupdf.Document, page_no: int, dpi: int, lang: str) -> str:
+    """Hashes a page's content stream and embedded images with the OCR settings."""
+    page = doc[page_no - 1]
+    digest = hashlib.sha256(f"{dpi}:{lang}:".encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+
+def ocr_page(
+    file_path: str,
+    page_no: int,
+    dpi: int = settings.OCR_DPI,
+    lang: str = settings.OCR_LANG,
+) -> str:
+    """Returns the OCR text of one page, rasterizing it only on a cache miss."""
+    with pymupdf.open(file_path) as doc:
+        page_hash = page_fingerprint(doc, page_no, dpi, lang)
+        cached = document_store.get_ocr_text(page_hash)
+        if cached is not None:
+            return cached
+        pixmap = doc[page_no - 1].get_pixmap(dpi=dpi, colorspace=pymupdf.csGRAY)
+    image = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+    try:
+        text = pytesseract.image_to_string(image, lang=lang)
+    except Exception as e:
+        # Raised for the caller to report the page, and not cached. Some
+        # pytesseract errors cannot be unpickled, which would break the
+        # process pool, so only the message is passed on.
+        raise RuntimeError(f"Tesseract error: {e}") from None
+    document_store.put_ocr_text(page_hash, text)
+    return text
@@ -0,0 +1,204 @@
+"""Document pipeline stages.
+
+Each stage is a plain module-level function so the ingestion engine can run
+it in a worker process; models come from that process's model registry.
+"""
+
+import re
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+import numpy as np
+import pymupdf
+
+from app.services import related_graph, settings
+from app.services.checkpoint import checkpoint
+from app.services.document_store import document_store
+from app.services.embedding_matrix import embedding_matrix
+from app.services.embeddings import embedder
+from app.services.model_registry import model_registry
+from app.services.records import DocumentEntity, ExtractionResult, Passage
+from app.services.search_cache import search_cache
+from app.services.vector_index import passage_index, vector_index
+
+# Bump whenever a stage's output changes so cached results are recomputed.
+PIPELINE_VERSION = "4"
+# Cached results hold embeddings, so they are also keyed by the embedding
+# version and passage layout (the passage index version covers both).
+CACHE_VERSION = f"{PIPELINE_VERSION}:{passage_index.version}"
+ENTITY_LABELS = ["PER", "ORG", "LOC", "MISC", "DATE"]
+NER_MAX_CHARS = 100000
+WORD_RE = re.compile(r"\S+")
+
+
+def iter_pages(file_path: str) -> Iterator[tuple[int, int, str]]:
+    """Yields (page_no, page_count, text) for each page, one page in memory at a time."""
+    with pymupdf.open(file_path) as doc:
+        for page in doc:
+            yield page.number + 1, doc.page_count, page.get_text()
+
+
+def extract_pages(doc_id: str, file_path: str, progress: dict) -> ExtractionResult:
+    """Streams the PDF's pages into the document store in batches.
+
+    Only a bounded prefix of the text is kept: `nlp_text` for YAKE/NER and
+    `preview` for the document record. Pages without a text layer are
+    listed in `ocr_pages` for the OCR stage. `progress` is updated with the pages
+    done and total so the caller can report it, and extraction stops early
+    when the caller sets `progress["cancelled"]`.
+    """
+    document_store.delete_pages(doc_id)
+    batch: list[tuple[int, str]] = []
+    nlp_parts: list[str] = []
+    nlp_chars = 0
+    ocr_pages: list[int] = []
+    page_count = 0
+    for page_no, total, text in iter_pages(file_path):
+        if progress.get("cancelled"):
+            break
+        if len(text.strip()) < settings.OCR_MIN_CHARS:
+            ocr_pages.append(page_no)
+        batch.append((page_no, text))
+        page_count = page_no
+        if nlp_chars < settings.NLP_MAX_CHARS:
+            nlp_parts.append(text[: settings.NLP_MAX_CHARS - nlp_chars])
+            nlp_chars += len(nlp_parts[-1])
+        if len(batch) >= settings.PAGE_BATCH_SIZE:
+            document_store.add_pages(doc_id, batch)
+            batch = []
+        progress["done"] = page_no
+        progress["total"] = total
+    if batch and not progress.get("cancelled"):
+        document_store.add_pages(doc_id, batch)
+    nlp_text = "\n".join(nlp_parts)
+    return {
+        "page_count": page_count,
+        "preview": nlp_text[: settings.TEXT_PREVIEW_CHARS],
+        "nlp_text": nlp_text,
+        "ocr_pages": ocr_pages,
+    }
+
+
+def text_prefix(doc_id: str, max_chars: int = settings.NLP_MAX_CHARS) -> str:
+    """Reads at most `max_chars` of a document's stored pages."""
+    parts: list[str] = []
+    chars = 0
+    for text in document_store.iter_page_texts(doc_id):
+        parts.append(text[: max_chars - chars])
+        chars += len(parts[-1])
+        if chars >= max_chars:
+            break
+    return "\n".join(parts)
+
+
+def extract_keywords(text: str) -> list[str]:
+    kw_extractor = model_registry.keyword_extractor()
+    return [k[0] for k in kw_extractor.extract_keywords(text)]
+
+
+def extract_entities(text: str) -> list[DocumentEntity]:
+    nlp = model_registry.spacy_pipeline()
+    entities = []
+    seen_entities = set()
+    for ent in nlp(text[:NER_MAX_CHARS]).ents:
+        if ent.label_ in ENTITY_LABELS and ent.text not in seen_entities:
+            entities.append({"text": ent.text, "label": ent.label_})
+            seen_entities.add(ent.text)
+    return entities
+
+
+def split_passages(pages: Iterable[tuple[int, str]]) -> Iterator[Passage]:
+    """Splits pages into overlapping windows of `PASSAGE_WORDS` words.
+
+    Passages never span pages, so each one has a page number and the
+    character offset of its first word on that page.
+    """
+    size = settings.PASSAGE_WORDS
+    step = size - settings.PASSAGE_OVERLAP
+    passage_no = 0
+    for page_no, text in pages:
+        spans = [match.span() for match in WORD_RE.finditer(text)]
+        for start in range(0, max(len(spans) - settings.PASSAGE_OVERLAP, 1), step):
+            window = spans[start : start + size]
+            if not window:
+                continue
+            yield {
+                "passage_no": passage_no,
+                "page_no": page_no,
+                "char_offset": window[0][0],
+                "text": text[window[0][0] : window[-1][1]],
+            }
+            passage_no += 1
+
+
+def passage_key(doc_id: str, passage_no: int) -> str:
+    return f"{doc_id}:{passage_no}"
+
+
+def parse_passage_key(key: str) -> tuple[str, int]:
+    doc_id, _, passage_no = key.rpartition(":")
+    return doc_id, int(passage_no)
+
+
+def embed_document(doc_id: str) -> np.ndarray:
+    """Embeds a document's passages into the store and returns its document vector.
+
+    Passages are embedded a batch at a time while streaming the stored pages;
+    the document vector is the word-weighted mean of the passage vectors.
+    """
+    document_store.delete_passages(doc_id)
+    passages = split_passages(document_store.iter_pages(doc_id))
+    total = np.zeros(settings.EMBEDDING_DIM, dtype="float64")
+    while batch := list(islice(passages, settings.PASSAGE_BATCH_SIZE)):
+        embeddings = embedder.embed_batch([passage["text"] for passage in batch])
+        document_store.add_passages(doc_id, batch, embeddings)
+        words = np.array(
+            [len(WORD_RE.findall(passage["text"])) for passage in batch],
+            dtype="float64",
+        )
+        total += (embeddings * words[:, None]).sum(axis=0)
+    vec = total.astype("float32")
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+def index_passages(doc_id: str) -> int:
+    """Replaces a document's passages in the passage index with the stored ones.
+
+    The index is saved at the next checkpoint.
+    """
+    passage_index.remove_labels(passage_index.labels_for([doc_id]))
+    passage_nos, embeddings = document_store.passage_embeddings(doc_id)
+    if passage_nos:
+        passage_index.add_many(
+            [passage_key(doc_id, passage_no) for passage_no in passage_nos],
+            embeddings,
+        )
+    checkpoint.mark(passage_index)
+    return len(passage_nos)
+
+
+def reembed_documents() -> int:
+    """Re-embeds every completed document and its passages from its pages.
+
+    Used when a saved index was built by another embedding version or
+    passage layout. Documents without stored pages are skipped.
+    """
+    doc_ids = document_store.ids(status="completed")
+    for doc_id in doc_ids:
+        embedding = embed_document(doc_id)
+        if not index_passages(doc_id):
+            continue
+        embedding_matrix.put(doc_id, embedding)
+        vector_index.add(doc_id, embedding)
+    embedding_matrix.save()
+    embedding_matrix.needs_rebuild = False
+    vector_index.save()
+    passage_index.save()
+    vector_index.needs_rebuild = False
+    passage_index.needs_rebuild = False
+    related_graph.rebuild()
+    search_cache.invalidate()
+    return len(doc_ids)
@@ -0,0 +1,110 @@
+from typing import TypedDict
+
+import numpy as np
+
+
+class DocumentEntity(TypedDict):
+    text: str
+    label: str
+
+
+class Document(TypedDict):
+    id: str
+    title: str
+    author: str
+    upload_date: str
+    file_path: str
+    file_hash: str
+    status: str
+    pipeline_stage: int
+    stage_detail: str
+    page_count: int
+    extracted_text: str
+    keywords: list[str]
+    entities: list[DocumentEntity]
+
+
+class DocumentSummary(TypedDict):
+    id: str
+    title: str
+    author: str
+    upload_date: str
+    status: str
+    pipeline_stage: int
+    stage_detail: str
+
+
+class DocumentPage(TypedDict):
+    page_no: int
+    text: str
+
+
+class UploadProgress(TypedDict):
+    name: str
+    bytes: int
+    # "uploading", "uploaded", "duplicate" or "rejected".
+    status: str
+    detail: str
+
+
+class Job(TypedDict):
+    doc_id: str
+    # "pending", "running", "cancelled" or "dead".
+    status: str
+    # Pipeline stages completed, see the checkpoints in job_queue.
+    stage: int
+    attempts: int
+    # Session of the uploader, which is shown the job's progress.
+    client_token: str
+    error: str
+
+
+class SearchHit(TypedDict):
+    """What a search result card shows, without the document's full text."""
+
+    id: str
+    title: str
+    author: str
+    upload_date: str
+    score: float
+    snippet: str
+    snippet_page: int
+    keywords: list[str]
+
+
+class Passage(TypedDict):
+    passage_no: int
+    page_no: int
+    char_offset: int
+    text: str
+
+
+class PassageHit(TypedDict):
+    doc_id: str
+    score: float
+    passage_no: int
+
+
+class SearchFilters(TypedDict, total=False):
+    author: str
+    year: str
+    keyword: str
+    entity_label: str
+    entity_text: str
+    status: str
+
+
+class ExtractionResult(TypedDict):
+    page_count: int
+    preview: str
+    nlp_text: str
+    ocr_pages: list[int]
+
+
+class PipelineResult(TypedDict):
+    author: str
+    page_count: int
+    extracted_text: str
+    keywords: list[str]
+    entities: list[DocumentEntity]
+    embedding: np.ndarray
@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from app.services import settings
+from app.services.vector_index import VectorIndex, vector_index
+
+
+class RelatedGraph:
+    """k-nearest-neighbour graph of completed documents for "Related Works".
+
+    Each document keeps its `k` most similar documents (cosine similarity of
+    the unit-length document embeddings), so the detail view is a dict
+    lookup instead of a search. `update` handles one newly indexed document:
+    it finds its neighbours, then inserts it into their lists when it beats
+    their weakest neighbour, tracking reverse edges so removing or replacing a
+    document only re-queries the documents that pointed to it. `rebuild`
+    recomputes every list with blocked matrix products over the embedding
+    matrix, a block of rows at a time sized to `block_bytes`.
+    """
+
+    def __init__(
+        self,
+        index: VectorIndex,
+        k: int = settings.RELATED_K,
+        candidates: int = settings.RELATED_CANDIDATES,
+        path: Path | None = None,
+        version: str = "",
+        block_bytes: int = settings.RELATED_BLOCK_BYTES,
+    ):
+        self.index = index
+        self.k = k
+        self.candidates = max(candidates, k)
+        self.path = path
+        self.version = version
+        self.block_bytes = block_bytes
+        self.needs_rebuild = False
+        self._lock = threading.RLock()
+        self._neighbors: dict[str, list[tuple[str, float]]] = {}
+        self._reverse: dict[str, set[str]] = {}
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._neighbors
+
+    def neighbors(self, doc_id: str) -> list[tuple[str, float]]:
+        """Returns (doc_id, similarity) pairs, most similar first."""
+        return list(self._neighbors.get(doc_id, ()))
+
+    def _query(
+        self, doc_id: str, embedding, k: int | None = None
+    ) -> list[tuple[str, float]]:
+        k = k or self.k
+        hits = self.index.search(embedding, k + 1)
+        return [
+            (other_id, 1 - distance / 2)
+            for other_id, distance in hits
+            if other_id != doc_id
+        ][:k]
+
+    def _set(self, doc_id: str, neighbors: list[tuple[str, float]]) -> None:
+        for other_id, _ in self._neighbors.get(doc_id, ()):
+            self._reverse.get(other_id, set()).discard(doc_id)
+        self._neighbors[doc_id] = neighbors
+        for other_id, _ in neighbors:
+            self._reverse.setdefault(other_id, set()).add(doc_id)
+
+    def _detach(self, doc_id: str) -> set[str]:
+        """Drops a document and returns the documents whose lists lost it."""
+        self._set(doc_id, [])
+        del self._neighbors[doc_id]
+        affected = self._reverse.pop(doc_id, set())
+        for other_id in affected:
+            self._neighbors[other_id] = [
+                (n, sim) for n, sim in self._neighbors[other_id] if n != doc_id
+            ]
+        return affected
+
+    def _refill(self, doc_ids) -> None:
+        for doc_id in doc_ids:
+            embedding = self.index.get(doc_id)
+            if embedding is None:
+                if doc_id in self._neighbors:
+                    self._detach(doc_id)
+            else:
+                self._set(doc_id, self._query(doc_id, embedding))
+
+    def update(self, doc_id: str, embedding) -> None:
+        """Adds or replaces a document that is already in the vector index.
+
+        Reverse edges are found among the `candidates` nearest documents, so
+        a document whose neighbours are all closer than that set may miss
+        the new one until the next `rebuild`.
+        """
+        with self._lock:
+            affected = self._detach(doc_id) if doc_id in self._neighbors else set()
+            # Documents outside the new one's own top k can still gain it as a
+            # neighbour, so a wider candidate set is checked for reverse edges.
+            candidates = self._query(doc_id, embedding, self.candidates)
+            self._set(doc_id, candidates[: self.k])
+            for other_id, sim in candidates:
+                current = self._neighbors.get(other_id)
+                if current is None:
+                    continue
+                if len(current) < self.k or sim > current[-1][1]:
+                    current = sorted(
+                        current + [(doc_id, sim)], key=lambda n: n[1], reverse=True
+                    )
+                    self._set(other_id, current[: self.k])
+            self._refill(affected - {doc_id})
+
+    def remove(self, doc_id: str) -> None:
+        """Drops a document that was removed from the vector index."""
+        with self._lock:
+            if doc_id in self._neighbors:
+                self._refill(self._detach(doc_id))
+
+    def rebuild(self) -> int:
+        """Recomputes every neighbour list from the full embedding matrix."""
+        with self._lock:
+            doc_ids, vectors = self.index.vectors()
+            neighbors: dict[str, list[tuple[str, float]]] = {}
+            k = min(self.k, len(doc_ids) - 1)
+            block_size = max(1, self.block_bytes // (4 * max(len(doc_ids), 1)))
+            for start in range(0, len(doc_ids), block_size):
+                sims = vectors[start : start + block_size] @ vectors.T
+                rows = np.arange(len(sims))
+                sims[rows, rows + start] = -np.inf
+                if k <= 0:
+                    top = np.zeros((len(sims), 0), dtype="int64")
+                else:
+                    top = np.argpartition(sims, -k, axis=1)[:, -k:]
+                for row, columns in enumerate(top):
+                    columns = columns[np.argsort(-sims[row, columns])]
+                    neighbors[doc_ids[start + row]] = [
+                        (doc_ids[column], float(sims[row, column]))
+                        for column in columns
+                    ]
+            self._neighbors = {}
+            self._reverse = {}
+            for doc_id, doc_neighbors in neighbors.items():
+                self._set(doc_id, doc_neighbors)
+            self.needs_rebuild = False
+        return len(doc_ids)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            payload = json.dumps(
+                {"version": self.version, "k": self.k, "neighbors": self._neighbors}
+            )
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(payload)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            self.needs_rebuild = True
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except Exception as e:
+            logging.exception(f"Related graph load error: {e}")
+            self.needs_rebuild = True
+            return
+        if data.get("version") != self.version or data.get("k") != self.k:
+            self.needs_rebuild = True
+            return
+        with self._lock:
+            self._neighbors = {}
+            self._reverse = {}
+            for doc_id, doc_neighbors in data["neighbors"].items():
+                self._set(doc_id, [tuple(neighbor) for neighbor in doc_neighbors])
+
+
+related_graph = RelatedGraph(
+    vector_index,
+    path=settings.RELATED_GRAPH_PATH,
+    version=settings.EMBEDDING_VERSION,
+)
+
+
+def rebuild() -> int:
+    """Rebuilds and saves the related-documents graph; run off the event loop."""
+    count = related_graph.rebuild()
+    related_graph.save()
+    return count
@@ -0,0 +1,60 @@
+import threading
+from collections.abc import Iterable
+
+from app.services.document_store import document_store
+
+
+class RowIndex:
+    """Base for in-memory indexes built from the document store's library rows.
+
+    `load()` builds the index aside with `_build()`, without holding the
+    lock, so refreshes are not blocked meanwhile; the documents they name
+    are re-read once the built index has been swapped in with `_swap()`.
+    Until then `ready` is False and callers fall back to SQL. Subclasses
+    keep one document up to date with `_put()` and `remove()`.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        # Documents refreshed while `load` builds the index, re-read at the end.
+        self._changed: set[str] | None = None
+
+    def _build(self, rows: Iterable[dict]):
+        raise NotImplementedError
+
+    def _swap(self, built) -> None:
+        raise NotImplementedError
+
+    def _put(self, row: dict) -> None:
+        raise NotImplementedError
+
+    def remove(self, doc_id: str) -> None:
+        raise NotImplementedError
+
+    def load(self) -> None:
+        """Indexes every document in the store."""
+        with self._lock:
+            if self.ready or self._changed is not None:
+                return
+            self._changed = set()
+        built = self._build(document_store.iter_library_rows())
+        with self._lock:
+            changed, self._changed = self._changed, None
+            self._swap(built)
+            for doc_id in changed:
+                self.refresh(doc_id)
+            self.ready = True
+
+    def refresh(self, doc_id: str) -> None:
+        """Re-reads one document after its row changes."""
+        with self._lock:
+            if self._changed is not None:
+                self._changed.add(doc_id)
+                return
+        rows = list(document_store.iter_library_rows(doc_id))
+        with self._lock:
+            if rows:
+                self._put(rows[0])
+            else:
+                self.remove(doc_id)
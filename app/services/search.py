@@ -0,0 +1,50 @@
+"""Query-side helpers shared by semantic search and related documents."""
+
+from collections import defaultdict
+from collections.abc import Collection
+
+from app.services import settings
+from app.services.pipeline import parse_passage_key
+from app.services.records import PassageHit
+from app.services.vector_index import passage_index
+
+
+def search_passages(
+    query_embedding,
+    candidates: int = settings.PASSAGE_CANDIDATES,
+    aggregation: str = settings.PASSAGE_AGGREGATION,
+    top_k: int = settings.PASSAGE_TOP_K,
+    doc_ids: Collection[str] | None = None,
+) -> list[PassageHit]:
+    """Scores documents by their nearest passages, best document first.
+
+    Passage similarity is the cosine of the unit-length embeddings,
+    1 - d / 2 for squared L2 distance d. A document scores its best passage
+    ("max") or the sum of its `top_k` best divided by `top_k` ("sum"), so
+    scores stay in [0, 1]; `passage_no` is the best passage, used as the
+    result snippet. `doc_ids` restricts the search to
+    the passages of those documents.
+    """
+    sims: dict[str, list[tuple[float, int]]] = defaultdict(list)
+    for key, distance in passage_index.search(
+        query_embedding, candidates, doc_ids=doc_ids
+    ):
+        doc_id, passage_no = parse_passage_key(key)
+        sims[doc_id].append((max(0.0, 1 - distance / 2), passage_no))
+    hits: list[PassageHit] = []
+    for doc_id, passage_sims in sims.items():
+        # Hits arrive nearest first, so each list is already sorted.
+        best, passage_no = passage_sims[0]
+        if aggregation == "sum":
+            score = sum(sim for sim, _ in passage_sims[:top_k]) / top_k
+        else:
+            score = best
+        hits.append({"doc_id": doc_id, "score": score, "passage_no": passage_no})
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return hits
+
+
+def snippet(text: str, max_chars: int = settings.SNIPPET_CHARS) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.services import settings
+from app.services.keyword_index import tokenize
+
+
+def normalize_query(text: str) -> str:
+    """Folds the query differences that the retrievers ignore.
+
+    The hashed embeddings and BM25 both see only the normalized tokens, so
+    case, accents and punctuation are folded; transformer embeddings are
+    case and accent sensitive, so only whitespace is.
+    """
+    if settings.EMBEDDING_BACKEND == "hashing":
+        return " ".join(tokenize(text))
+    return " ".join(text.split())
+
+
+class SearchCache:
+    """LRU cache of hybrid search results with a time-to-live.
+
+    Entries are keyed by the normalized query, `top_k` and the filters.
+    `generation` counts index changes: `invalidate()` bumps it and drops
+    every entry, and `put` ignores results computed under an older
+    generation, so a search that raced with an index change is not cached.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.SEARCH_CACHE_SIZE,
+        ttl: float = settings.SEARCH_CACHE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, list[dict]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(query_text: str, top_k: int, **filters) -> tuple:
+        return (
+            normalize_query(query_text),
+            top_k,
+            tuple(sorted((name, value) for name, value in filters.items() if value)),
+        )
+
+    def get(self, key: tuple) -> list[dict] | None:
+        """Returns copies of the cached results, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(result) for result in entry[1]]
+
+    def put(self, key: tuple, results: list[dict], generation: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (
+                time.monotonic(),
+                [dict(result) for result in results],
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Called whenever the set of searchable documents or their vectors change."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "generation": self.generation,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+search_cache = SearchCache()
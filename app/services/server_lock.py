@@ -0,0 +1,52 @@
+import os
+from pathlib import Path
+
+from app.services import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock is not enforced.
+    fcntl = None
+
+
+class ServerLock:
+    """Exclusive lock on the data directory, held while the server runs.
+
+    The indexes live in the server's memory and are checkpointed to files in
+    DATA_DIR, so a single backend process may use a data directory at a time:
+    a second one would overwrite the first one's indexes. The job queue only
+    hands jobs back across restarts of that process.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> None:
+        """Takes the lock, raising RuntimeError if another process holds it."""
+        if fcntl is None or self._file is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = self.path.open("a+")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.seek(0)
+            pid = file.read().strip()
+            file.close()
+            raise RuntimeError(
+                f"{self.path.parent} is in use by another server (pid {pid}); "
+                "run a single backend worker per data directory"
+            ) from None
+        file.truncate(0)
+        file.write(f"{os.getpid()}\n")
+        file.flush()
+        self._file = file
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+server_lock = ServerLock(settings.SERVER_LOCK_PATH)
@@ -0,0 +1,190 @@
+import os
+from pathlib import Path
+
+DATA_DIR = Path(os.environ.get("MONOGRAPH_DATA_DIR", ".data"))
+# Held by the one backend process that may use DATA_DIR (see server_lock).
+SERVER_LOCK_PATH = DATA_DIR / "server.lock"
+
+# "hashing" (128-dim hashed bag of words) or "bertimbau" (768-dim mean-pooled
+# transformer embeddings, see TRANSFORMER_* below).
+EMBEDDING_BACKEND = os.environ.get("MONOGRAPH_EMBEDDING_BACKEND", "hashing")
+EMBEDDING_DIM = 768 if EMBEDDING_BACKEND == "bertimbau" else 128
+VECTOR_INDEX_PATH = DATA_DIR / "vectors.faiss"
+
+# Approximate nearest-neighbour backend: "flat" (exact), "ivf_flat", "ivf_pq"
+# or "hnsw". IVF variants fall back to exact search until the corpus holds
+# enough vectors to train on (IVF_TRAIN_FACTOR points per list). "ivf_pq" keeps
+# only the compressed codes in memory and re-ranks from the stored embeddings.
+VECTOR_INDEX_TYPE = os.environ.get("MONOGRAPH_VECTOR_INDEX", "flat")
+IVF_NLIST = int(os.environ.get("MONOGRAPH_IVF_NLIST", "256"))
+IVF_NPROBE = int(os.environ.get("MONOGRAPH_IVF_NPROBE", "16"))
+IVF_TRAIN_FACTOR = 39
+PQ_M = int(os.environ.get("MONOGRAPH_PQ_M", "16"))
+PQ_NBITS = 8
+HNSW_M = int(os.environ.get("MONOGRAPH_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("MONOGRAPH_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.environ.get("MONOGRAPH_HNSW_EF_SEARCH", "64"))
+# Number of vector candidates (k') retrieved before hybrid re-ranking.
+SEARCH_CANDIDATES = int(os.environ.get("MONOGRAPH_SEARCH_CANDIDATES", "100"))
+# Hybrid ranking: the vector and keyword candidates are fused by Reciprocal
+# Rank Fusion ("rrf", with constant RRF_K) or by the weighted sum of their
+# calibrated scores ("normalized"; BM25 scores are mapped to s / (s +
+# FUSION_BM25_MIDPOINT)).
+FUSION_METHOD = os.environ.get("MONOGRAPH_FUSION_METHOD", "rrf")
+FUSION_VECTOR_WEIGHT = float(os.environ.get("MONOGRAPH_FUSION_VECTOR_WEIGHT", "0.7"))
+FUSION_KEYWORD_WEIGHT = float(os.environ.get("MONOGRAPH_FUSION_KEYWORD_WEIGHT", "0.3"))
+RRF_K = 60
+FUSION_BM25_MIDPOINT = 10.0
+# Filtered searches score the selected vectors directly when there are at
+# most FILTER_EXACT_MAX of them, and pass an ID selector to FAISS otherwise.
+FILTER_EXACT_MAX = 4096
+# Hybrid search results are cached for SEARCH_CACHE_TTL seconds, keeping the
+# SEARCH_CACHE_SIZE most recently used queries (0 disables the cache).
+SEARCH_CACHE_SIZE = int(os.environ.get("MONOGRAPH_SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.environ.get("MONOGRAPH_SEARCH_CACHE_TTL", "300"))
+
+# Passage index: pages are split into windows of PASSAGE_WORDS words that
+# overlap by PASSAGE_OVERLAP words. Passage hits are aggregated per document
+# by their best score ("max") or the sum of their PASSAGE_TOP_K best ("sum").
+PASSAGE_INDEX_PATH = DATA_DIR / "passages.faiss"
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 30
+PASSAGE_BATCH_SIZE = 256
+PASSAGE_CANDIDATES = int(os.environ.get("MONOGRAPH_PASSAGE_CANDIDATES", "500"))
+PASSAGE_AGGREGATION = os.environ.get("MONOGRAPH_PASSAGE_AGGREGATION", "max")
+PASSAGE_TOP_K = 3
+SNIPPET_CHARS = 300
+# Keywords sent with each search result.
+SEARCH_HIT_KEYWORDS = 4
+
+# Related works: each completed document keeps its RELATED_K nearest
+# neighbours, updated as documents are indexed (RELATED_CANDIDATES nearest
+# documents are checked for reverse edges). Set MONOGRAPH_RELATED_REBUILD=1
+# to rebuild the whole graph from the embedding matrix on startup.
+RELATED_GRAPH_PATH = DATA_DIR / "related.json"
+RELATED_K = int(os.environ.get("MONOGRAPH_RELATED_K", "8"))
+RELATED_CANDIDATES = 64
+RELATED_REBUILD = os.environ.get("MONOGRAPH_RELATED_REBUILD", "0") == "1"
+# Memory for one block of similarities during a rebuild; the number of rows
+# per block shrinks as the library grows.
+RELATED_BLOCK_BYTES = 64 * 2**20
+
+# The vector, passage and embedding indexes are saved at most this often
+# (and when the server stops) rather than after every indexed document.
+CHECKPOINT_INTERVAL = float(os.environ.get("MONOGRAPH_CHECKPOINT_INTERVAL", "30"))
+
+# Document embeddings are kept in a memory-mapped matrix, stored as "float32"
+# or "float16" (half the size, for similarity use only).
+EMBEDDING_MATRIX_PATH = DATA_DIR / "embeddings.npy"
+EMBEDDING_STORAGE_DTYPE = os.environ.get("MONOGRAPH_EMBEDDING_DTYPE", "float32")
+
+KEYWORD_INDEX_PATH = DATA_DIR / "keywords.pkl"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+DOCUMENT_STORE_PATH = DATA_DIR / "documents.sqlite3"
+# The library loads LIBRARY_PAGE_SIZE summaries per page as the user scrolls
+# within LIBRARY_PREFETCH_PX of the end, keeping at most LIBRARY_MAX_LOADED.
+LIBRARY_PAGE_SIZE = 24
+LIBRARY_PAGE_SIZES = [24, 48, 96]
+LIBRARY_PREFETCH_PX = 600
+LIBRARY_MAX_LOADED = 240
+# The document text viewer loads TEXT_VIEWER_PAGES pages at a time as the
+# user scrolls within TEXT_VIEWER_PREFETCH_PX of the end, keeping at most
+# TEXT_VIEWER_MAX_LOADED pages.
+TEXT_VIEWER_PAGES = 4
+TEXT_VIEWER_PREFETCH_PX = 800
+TEXT_VIEWER_MAX_LOADED = 40
+# Search-as-you-type: keystrokes are debounced by LIBRARY_FILTER_DEBOUNCE_MS
+# and the in-memory filter keeps the results of this many recent queries.
+LIBRARY_FILTER_DEBOUNCE_MS = 250
+LIBRARY_FILTER_CACHE_SIZE = 128
+
+# Uploads are streamed to disk chunk by chunk; files larger than
+# UPLOAD_MAX_BYTES are rejected, and progress is reported to the client
+# every UPLOAD_PROGRESS_BYTES.
+UPLOAD_MAX_BYTES = int(os.environ.get("MONOGRAPH_UPLOAD_MAX_MB", "512")) * 2**20
+UPLOAD_PROGRESS_BYTES = 4 * 2**20
+
+# Streaming extraction: pages are written to the store in batches, only a
+# bounded prefix of the text is kept in memory for YAKE/NER and as the
+# document preview, and page progress is reported at most this often.
+PAGE_BATCH_SIZE = 32
+NLP_MAX_CHARS = int(os.environ.get("MONOGRAPH_NLP_MAX_CHARS", "200000"))
+TEXT_PREVIEW_CHARS = 20000
+PROGRESS_INTERVAL = 0.5
+
+# Processing jobs are kept in JOB_QUEUE_PATH. The server holds a job for
+# JOB_LEASE_SECONDS, renewed while it runs; jobs it held when it stopped
+# without releasing them are picked up again when it restarts. Failed jobs are
+# retried JOB_RETRY_DELAY * 2**n seconds later (at most JOB_RETRY_MAX_DELAY)
+# until they have run JOB_MAX_ATTEMPTS times, then dead-lettered.
+JOB_QUEUE_PATH = DATA_DIR / "jobs.sqlite3"
+JOB_LEASE_SECONDS = 60
+JOB_MAX_ATTEMPTS = int(os.environ.get("MONOGRAPH_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = 10.0
+JOB_RETRY_MAX_DELAY = 600.0
+JOB_POLL_INTERVAL = 5.0
+
+# Ingestion worker pool: number of documents processed concurrently (and
+# size of the process pool), and how many queued uploads may be handed to the
+# workers before the feeder waits for one to finish.
+INGEST_WORKERS = int(os.environ.get("MONOGRAPH_INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_MAX_PENDING = int(
+    os.environ.get("MONOGRAPH_INGEST_MAX_PENDING", 2 * INGEST_WORKERS)
+)
+
+SPACY_MODEL = os.environ.get("MONOGRAPH_SPACY_MODEL", "pt_core_news_sm")
+# "background" warms the worker models at startup without blocking it,
+# "blocking" waits for them before serving, "off" loads them on first use.
+MODEL_WARMUP = os.environ.get("MONOGRAPH_MODEL_WARMUP", "background")
+
+# Per-stage timeouts in seconds for the ingestion pipeline.
+STAGE_TIMEOUTS = {
+    "extract": float(os.environ.get("MONOGRAPH_TIMEOUT_EXTRACT", "600")),
+    "ocr_page": float(os.environ.get("MONOGRAPH_TIMEOUT_OCR_PAGE", "120")),
+    "keywords": float(os.environ.get("MONOGRAPH_TIMEOUT_KEYWORDS", "300")),
+    "entities": float(os.environ.get("MONOGRAPH_TIMEOUT_ENTITIES", "600")),
+    "embedding": float(os.environ.get("MONOGRAPH_TIMEOUT_EMBEDDING", "300")),
+    "indexing": float(os.environ.get("MONOGRAPH_TIMEOUT_INDEXING", "120")),
+}
+
+# OCR fallback for pages without a text layer (fewer than OCR_MIN_CHARS
+# extracted characters). Pages are rasterized at OCR_DPI and read by
+# Tesseract in the ingestion process pool; results are cached by page hash.
+OCR_ENABLED = os.environ.get("MONOGRAPH_OCR", "1") != "0"
+OCR_DPI = int(os.environ.get("MONOGRAPH_OCR_DPI", "300"))
+OCR_LANG = os.environ.get("MONOGRAPH_OCR_LANG", "por")
+OCR_MIN_CHARS = 10
+
+# Hashed bag-of-words embeddings: tokens hashed with CRC32 into
+# EMBEDDING_DIM buckets; hashes of the most frequent tokens are memoized.
+TOKEN_HASH_CACHE_SIZE = 200000
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Transformer embeddings: passages and queries are truncated to
+# TRANSFORMER_MAX_TOKENS tokens, batched up to TRANSFORMER_BATCH_TOKENS tokens
+# per forward pass and mean-pooled into one vector each.
+TRANSFORMER_MODEL = os.environ.get(
+    "MONOGRAPH_TRANSFORMER_MODEL", "neuralmind/bert-base-portuguese-cased"
+)
+TRANSFORMER_MAX_TOKENS = 512
+TRANSFORMER_BATCH_TOKENS = int(
+    os.environ.get("MONOGRAPH_TRANSFORMER_BATCH_TOKENS", "8192")
+)
+TRANSFORMER_QUANTIZE = os.environ.get("MONOGRAPH_TRANSFORMER_QUANTIZE", "1") != "0"
+TRANSFORMER_THREADS = int(
+    os.environ.get(
+        "MONOGRAPH_TRANSFORMER_THREADS",
+        max(1, (os.cpu_count() or 1) // INGEST_WORKERS),
+    )
+)
+
+# Stored vectors, the pipeline cache and the indexes are keyed by this, so
+# anything that changes the vectors belongs in it.
+EMBEDDING_VERSION = (
+    f"bertimbau:{TRANSFORMER_MODEL}:{TRANSFORMER_MAX_TOKENS}:"
+    f"{'int8' if TRANSFORMER_QUANTIZE else 'fp32'}"
+    if EMBEDDING_BACKEND == "bertimbau"
+    else "crc32-v1"
+)
@@ -0,0 +1,76 @@
+import hashlib
+import logging
+import os
+import uuid
+from pathlib import Path
+
+from app.services import settings
+
+PARTIAL_SUFFIX = ".part"
+
+
+class UploadWriter:
+    """Streams one uploaded file to disk as its chunks arrive.
+
+    Chunks are hashed and appended to a temporary file in `upload_dir`, so
+    memory use stays at one chunk whatever the file size. `commit()` moves
+    the finished file to `<sha256>.pdf` with an atomic rename; a file that
+    is aborted or interrupted never appears under its final name.
+    """
+
+    def __init__(
+        self, upload_dir: Path, name: str, max_bytes: int = settings.UPLOAD_MAX_BYTES
+    ):
+        self.upload_dir = upload_dir
+        self.name = name
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._tmp_path = upload_dir / f".{uuid.uuid4().hex}{PARTIAL_SUFFIX}"
+        self._file = self._tmp_path.open("wb")
+
+    def write(self, offset: int, data: bytes) -> None:
+        if offset != self.size:
+            raise ValueError(
+                f"{self.name}: expected a chunk at byte {self.size}, got {offset}"
+            )
+        if self.size + len(data) > self.max_bytes:
+            raise ValueError(
+                f"{self.name} is larger than the "
+                f"{self.max_bytes // 2**20} MB upload limit"
+            )
+        self._sha256.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        """Moves the file to its content-addressed name and returns its hash."""
+        if self.size == 0:
+            self.abort()
+            raise ValueError(f"{self.name} is empty")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        file_hash = self._sha256.hexdigest()
+        file_path = self.upload_dir / f"{file_hash}.pdf"
+        if file_path.exists():
+            self._tmp_path.unlink()
+        else:
+            os.replace(self._tmp_path, file_path)
+        return file_hash
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def remove_partial_uploads(upload_dir: Path) -> int:
+    """Deletes the temporary files of uploads interrupted by a restart."""
+    removed = 0
+    for path in upload_dir.glob(f".*{PARTIAL_SUFFIX}"):
+        try:
+            path.unlink()
+            removed += 1
+        except OSError as e:
+            logging.exception(f"Error removing partial upload {path}: {e}")
+    return removed
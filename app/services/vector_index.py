@@ -0,0 +1,534 @@
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable, Collection
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.services import settings
+from app.services.document_store import document_store
+from app.services.embedding_matrix import embedding_matrix
+from app.services.ids import doc_label
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# Vectors read at a time from an `exact_vectors` source to build an index.
+BUILD_BATCH = 65536
+
+
+class VectorIndex:
+    """Long-lived FAISS index of document embeddings keyed by document id.
+
+    Documents are added once when the pipeline completes them, instead of
+    rebuilding a flat index from every embedding on each query. An exact flat
+    index is always kept as the source of truth; when `index_type` selects an
+    approximate backend (IVF-Flat, IVF-PQ or HNSW) it is built alongside,
+    trained on the stored vectors, and its candidates are re-ranked with exact
+    distances. Searches never train: the approximate index is (re)built by
+    `save()`, off the request path, and searches stay exact until it is ready.
+
+    With `exact_vectors`, which returns the stored vectors of a list of keys
+    (NaN rows for unknown keys), the IVF-PQ backend keeps no flat copy: exact
+    distances are computed from that source instead, so only the compressed
+    codes are held in memory.
+
+    With `group_of`, keys are grouped by document (e.g. the passages of a
+    document) so that searches can be restricted to a set of documents.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        path: Path | None = None,
+        index_type: str = "flat",
+        version: str = "",
+        nlist: int = settings.IVF_NLIST,
+        nprobe: int = settings.IVF_NPROBE,
+        pq_m: int = settings.PQ_M,
+        hnsw_m: int = settings.HNSW_M,
+        ef_construction: int = settings.HNSW_EF_CONSTRUCTION,
+        ef_search: int = settings.HNSW_EF_SEARCH,
+        group_of: Callable[[str], str] | None = None,
+        exact_vectors: Callable[[list[str]], np.ndarray] | None = None,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unknown vector index type {index_type!r}, expected one of {INDEX_TYPES}"
+            )
+        self.dim = dim
+        self.path = path
+        self.index_type = index_type
+        self.version = version
+        self.needs_rebuild = False
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.group_of = group_of
+        self.exact_vectors = exact_vectors if index_type == "ivf_pq" else None
+        self._lock = threading.RLock()
+        self._index = self._new_index() if self.exact_vectors is None else None
+        self._ann: faiss.Index | None = None
+        self._ann_stale = False
+        self._ids: dict[int, str] = {}
+        self._groups: dict[str, set[int]] = {}
+        # Labels added and removed while `train` builds the approximate index.
+        self._building: tuple[set[int], set[int]] | None = None
+
+    def _new_index(self) -> faiss.IndexIDMap2:
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dim))
+
+    @property
+    def factory_string(self) -> str:
+        if self.index_type == "ivf_flat":
+            return f"IVF{self.nlist},Flat"
+        if self.index_type == "ivf_pq":
+            return f"IVF{self.nlist},PQ{self.pq_m}x{settings.PQ_NBITS}"
+        if self.index_type == "hnsw":
+            return f"HNSW{self.hnsw_m},Flat"
+        return "Flat"
+
+    @property
+    def min_train_size(self) -> int:
+        if self.index_type == "ivf_pq":
+            centroids = max(self.nlist, 2**settings.PQ_NBITS)
+            return centroids * settings.IVF_TRAIN_FACTOR
+        if self.index_type == "ivf_flat":
+            return self.nlist * settings.IVF_TRAIN_FACTOR
+        return 1
+
+    @property
+    def ann_ready(self) -> bool:
+        return self._ann is not None and not self._ann_stale
+
+    @property
+    def needs_training(self) -> bool:
+        return (
+            self.index_type != "flat"
+            and len(self) >= self.min_train_size
+            and not self.ann_ready
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_label(doc_id) in self._ids
+
+    def _link(self, labels, keys) -> None:
+        if self.group_of is None:
+            return
+        for label, key in zip(labels, keys):
+            self._groups.setdefault(self.group_of(key), set()).add(label)
+
+    def _record(self, added=(), removed=()) -> None:
+        if self._building is not None:
+            self._building[0].update(added)
+            self._building[1].update(removed)
+
+    def _unlink(self, labels) -> None:
+        if self.group_of is None:
+            return
+        for label in labels:
+            group = self.group_of(self._ids[label])
+            members = self._groups[group]
+            members.discard(label)
+            if not members:
+                del self._groups[group]
+
+    def labels_for(self, doc_ids: Collection[str]) -> np.ndarray:
+        """Returns the labels of the indexed vectors that belong to `doc_ids`."""
+        with self._lock:
+            if self.group_of is None:
+                labels = [
+                    label
+                    for label in (doc_label(doc_id) for doc_id in doc_ids)
+                    if label in self._ids
+                ]
+            else:
+                labels = [
+                    label
+                    for doc_id in doc_ids
+                    for label in self._groups.get(doc_id, ())
+                ]
+        return np.array(labels, dtype="int64")
+
+    def add(self, doc_id: str, embedding) -> None:
+        vector = np.asarray(embedding, dtype="float32").reshape(1, self.dim)
+        labels = np.array([doc_label(doc_id)], dtype="int64")
+        with self._lock:
+            replacing = int(labels[0]) in self._ids
+            if self._index is not None:
+                if replacing:
+                    self._index.remove_ids(labels)
+                self._index.add_with_ids(vector, labels)
+            self._ids[int(labels[0])] = doc_id
+            if not replacing:
+                self._link(labels.tolist(), [doc_id])
+            self._record(labels.tolist(), labels.tolist() if replacing else ())
+            if self._ann is not None:
+                if replacing and self.index_type == "hnsw":
+                    self._ann_stale = True
+                else:
+                    if replacing:
+                        self._ann.remove_ids(labels)
+                    self._ann.add_with_ids(vector, labels)
+
+    def add_many(self, doc_ids: list[str], embeddings) -> None:
+        """Bulk-adds documents that are not yet indexed."""
+        vectors = np.asarray(embeddings, dtype="float32").reshape(-1, self.dim)
+        labels = np.array([doc_label(doc_id) for doc_id in doc_ids], dtype="int64")
+        with self._lock:
+            if self._index is not None:
+                self._index.add_with_ids(vectors, labels)
+            self._ids.update(zip(labels.tolist(), doc_ids))
+            self._link(labels.tolist(), doc_ids)
+            self._record(labels.tolist())
+            if self._ann is not None:
+                self._ann.add_with_ids(vectors, labels)
+
+    def remove(self, doc_id: str) -> bool:
+        labels = np.array([doc_label(doc_id)], dtype="int64")
+        with self._lock:
+            if int(labels[0]) not in self._ids:
+                return False
+            if self._index is not None:
+                self._index.remove_ids(labels)
+            self._unlink([int(labels[0])])
+            del self._ids[int(labels[0])]
+            self._record(removed=labels.tolist())
+            if self._ann is not None:
+                # HNSW graphs cannot drop nodes, so they are rebuilt lazily.
+                if self.index_type == "hnsw":
+                    self._ann_stale = True
+                else:
+                    self._ann.remove_ids(labels)
+            return True
+
+    def remove_labels(self, labels) -> int:
+        """Removes the indexed vectors with these labels (see `labels_for`)."""
+        with self._lock:
+            labels = np.array(
+                [int(label) for label in labels if int(label) in self._ids],
+                dtype="int64",
+            )
+            if not len(labels):
+                return 0
+            if self._index is not None:
+                self._index.remove_ids(labels)
+            self._unlink(labels.tolist())
+            for label in labels.tolist():
+                del self._ids[label]
+            self._record(removed=labels.tolist())
+            if self._ann is not None:
+                if self.index_type == "hnsw":
+                    self._ann_stale = True
+                else:
+                    self._ann.remove_ids(labels)
+            return len(labels)
+
+    def get(self, doc_id: str) -> np.ndarray | None:
+        label = doc_label(doc_id)
+        with self._lock:
+            if label not in self._ids:
+                return None
+            return self._vectors_of(np.array([label], dtype="int64"))[0]
+
+    def vectors(self) -> tuple[list[str], np.ndarray]:
+        """Returns every indexed id and the matrix of their stored vectors."""
+        with self._lock:
+            vectors, labels = self._stored_vectors()
+            return [self._ids[int(label)] for label in labels], vectors
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self._ids.values())
+
+    def _stored_vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._index is None:
+            labels = np.fromiter(self._ids, dtype="int64", count=len(self._ids))
+            return self._vectors_of(labels), labels
+        flat = faiss.downcast_index(self._index.index)
+        vectors = flat.reconstruct_n(0, self._index.ntotal)
+        labels = faiss.vector_to_array(self._index.id_map).astype("int64")
+        return vectors, labels
+
+    def _vectors_of(self, labels: np.ndarray) -> np.ndarray:
+        """Returns the exact vectors of indexed labels, NaN rows for any missing."""
+        if self._index is not None:
+            return self._index.reconstruct_batch(labels)
+        vectors = self.exact_vectors([self._ids[int(label)] for label in labels])
+        return np.asarray(vectors, dtype="float32").reshape(-1, self.dim)
+
+    def _build(self, ann: faiss.Index, labels: np.ndarray, keys: list[str]) -> None:
+        """Trains and fills an index from `exact_vectors` a batch at a time.
+
+        It is trained on a sample of the vectors, so the whole corpus is
+        never read into memory at once.
+        """
+        sample = np.random.default_rng(0).permutation(len(keys))[
+            : 4 * self.min_train_size
+        ]
+        vectors = self.exact_vectors([keys[i] for i in sample])
+        ann.train(vectors[~np.isnan(vectors).any(axis=1)])
+        for start in range(0, len(keys), BUILD_BATCH):
+            vectors = self.exact_vectors(keys[start : start + BUILD_BATCH])
+            found = ~np.isnan(vectors).any(axis=1)
+            ann.add_with_ids(vectors[found], labels[start : start + BUILD_BATCH][found])
+
+    def train(self) -> bool:
+        """(Re)builds the approximate index from every stored vector.
+
+        The index is built without holding the lock, so searches go on
+        (exactly) meanwhile, and the vectors added or removed during the
+        build are applied to it before it is swapped in. Returns False when
+        the configured backend is exact, the corpus is still too small to
+        train on, another build is running, or an HNSW graph would have to
+        drop vectors removed during the build; it stays stale until the
+        next call then.
+        """
+        with self._lock:
+            if self.index_type == "flat" or len(self) < self.min_train_size:
+                self._ann = None
+                self._ann_stale = False
+                return False
+            if self._building is not None:
+                return False
+            if self._index is None:
+                vectors = None
+                labels = np.fromiter(self._ids, dtype="int64", count=len(self._ids))
+                keys = [self._ids[int(label)] for label in labels]
+            else:
+                vectors, labels = self._stored_vectors()
+            self._building = (set(), set())
+        try:
+            base = faiss.index_factory(self.dim, self.factory_string)
+            if self.index_type == "hnsw":
+                faiss.downcast_index(base).hnsw.efConstruction = self.ef_construction
+                ann = faiss.IndexIDMap2(base)
+            else:
+                # IVF lists store ids natively; an IDMap wrapper would
+                # mis-compact its id table on remove_ids.
+                ann = base
+            if vectors is None:
+                self._build(ann, labels, keys)
+            else:
+                ann.train(vectors)
+                ann.add_with_ids(vectors, labels)
+        except BaseException:
+            with self._lock:
+                self._building = None
+            raise
+        with self._lock:
+            added, removed = self._building
+            self._building = None
+            if removed and self.index_type == "hnsw":
+                # HNSW graphs cannot drop nodes.
+                self._ann_stale = True
+                return False
+            if removed:
+                ann.remove_ids(np.array(sorted(removed), dtype="int64"))
+            changed = np.array(
+                sorted(label for label in added | removed if label in self._ids),
+                dtype="int64",
+            )
+            if len(changed):
+                vectors = self._vectors_of(changed)
+                found = ~np.isnan(vectors).any(axis=1)
+                ann.add_with_ids(vectors[found], changed[found])
+            self._ann = ann
+            self._ann_stale = False
+            return True
+
+    def _search_params(self, nprobe: int | None, ef_search: int | None, selector):
+        if self.index_type.startswith("ivf"):
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, sel=selector)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(
+                efSearch=ef_search or self.ef_search, sel=selector
+            )
+        return None
+
+    def _search_labels(self, query: np.ndarray, labels: np.ndarray, k: int):
+        """Exact search over a few vectors, scoring only those vectors."""
+        vectors = self._vectors_of(labels)
+        distances = np.nan_to_num(((vectors - query) ** 2).sum(axis=1), nan=np.inf)
+        top = np.argpartition(distances, k - 1)[:k] if k < len(labels) else None
+        order = np.arange(len(labels)) if top is None else top
+        order = order[np.argsort(distances[order])]
+        return [
+            (self._ids[int(labels[i])], float(distances[i]))
+            for i in order
+            if np.isfinite(distances[i])
+        ]
+
+    def search(
+        self,
+        embedding,
+        k: int,
+        exact: bool = False,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        doc_ids: Collection[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Returns up to k (doc_id, squared L2 distance) pairs, nearest first.
+
+        With an approximate backend the k candidates come from the ANN index
+        (tuned by `nprobe`/`ef_search`) and are re-ranked by exact distance.
+        `doc_ids` restricts the search to those documents' vectors: a small
+        selection is scored directly, a larger one is passed to FAISS as an
+        ID selector so excluded vectors are skipped during the scan.
+        """
+        query = np.asarray(embedding, dtype="float32").reshape(1, self.dim)
+        with self._lock:
+            selector = None
+            if doc_ids is not None:
+                labels = self.labels_for(doc_ids)
+                k = min(k, len(labels))
+                if k <= 0:
+                    return []
+                if len(labels) <= settings.FILTER_EXACT_MAX or (
+                    self._index is None and (exact or not self.ann_ready)
+                ):
+                    return self._search_labels(query, labels, k)
+                selector = faiss.IDSelectorBatch(labels)
+            k = min(k, len(self))
+            if k <= 0:
+                return []
+            if self._index is None and (exact or not self.ann_ready):
+                labels = np.fromiter(self._ids, dtype="int64", count=len(self._ids))
+                return self._search_labels(query, labels, k)
+            if exact or not self.ann_ready:
+                params = (
+                    None if selector is None else faiss.SearchParameters(sel=selector)
+                )
+                distances, labels = self._index.search(query, k, params=params)
+                return [
+                    (self._ids[int(label)], float(distance))
+                    for distance, label in zip(distances[0], labels[0])
+                    if label != -1
+                ]
+            _, labels = self._ann.search(
+                query, k, params=self._search_params(nprobe, ef_search, selector)
+            )
+            labels = labels[0][labels[0] != -1]
+            if not len(labels):
+                return []
+            return self._search_labels(query, labels, len(labels))
+
+    def _meta_path(self) -> Path:
+        return self.path.with_suffix(".ids.json")
+
+    def _ann_path(self) -> Path:
+        return self.path.with_suffix(".ann.faiss")
+
+    def save(self) -> None:
+        """Writes the index, first (re)building the approximate index if it is due."""
+        if self.needs_training:
+            self.train()
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            tmp_index = self.path.with_suffix(".faiss.tmp")
+            if self._index is not None:
+                faiss.write_index(self._index, str(tmp_index))
+            tmp_meta = self._meta_path().with_suffix(".json.tmp")
+            tmp_meta.write_text(
+                json.dumps(
+                    {
+                        "version": self.version,
+                        "factory": self.factory_string if self.ann_ready else None,
+                        "ids": {
+                            str(label): doc_id for label, doc_id in self._ids.items()
+                        },
+                    }
+                )
+            )
+            if self.ann_ready:
+                tmp_ann = self._ann_path().with_suffix(".faiss.tmp")
+                faiss.write_index(self._ann, str(tmp_ann))
+                os.replace(tmp_ann, self._ann_path())
+            if self._index is not None:
+                os.replace(tmp_index, self.path)
+            else:
+                self.path.unlink(missing_ok=True)
+            os.replace(tmp_meta, self._meta_path())
+
+    def load(self) -> None:
+        if self.path is None or not self._meta_path().exists():
+            return
+        if self.exact_vectors is None and not self.path.exists():
+            # Saved without its flat copy; rebuilt from the pipeline.
+            self.needs_rebuild = True
+            return
+        try:
+            index = None
+            if self.exact_vectors is None:
+                index = faiss.read_index(str(self.path))
+            meta = json.loads(self._meta_path().read_text())
+            ids = {int(k): v for k, v in meta["ids"].items()}
+        except Exception as e:
+            logging.exception(f"Vector index load error: {e}")
+            return
+        if meta.get("version", "") != self.version:
+            logging.warning(
+                f"Ignoring vector index at {self.path}: built with embedding version "
+                f"{meta.get('version')!r}, expected {self.version!r}"
+            )
+            self.needs_rebuild = True
+            return
+        if index is not None and (index.d != self.dim or index.ntotal != len(ids)):
+            logging.warning(
+                f"Ignoring vector index at {self.path}: expected dim {self.dim}, "
+                f"found dim {index.d} with {index.ntotal} vectors for {len(ids)} ids"
+            )
+            return
+        ann = None
+        if meta.get("factory") == self.factory_string and self._ann_path().exists():
+            try:
+                ann = faiss.read_index(str(self._ann_path()))
+            except Exception as e:
+                logging.exception(f"ANN index load error: {e}")
+        with self._lock:
+            self._index = index
+            self._ids = ids
+            self._groups = {}
+            self._link(ids.keys(), ids.values())
+            if ann is not None and (ann.d != self.dim or ann.ntotal != len(ids)):
+                ann = None
+            self._ann = ann
+            self._ann_stale = False
+        if self.needs_training:
+            self.train()
+
+
+def passage_vectors(keys: list[str]) -> np.ndarray:
+    return document_store.passage_vectors(
+        [(doc_id, int(no)) for doc_id, _, no in (key.rpartition(":") for key in keys)]
+    )
+
+
+vector_index = VectorIndex(
+    settings.EMBEDDING_DIM,
+    settings.VECTOR_INDEX_PATH,
+    settings.VECTOR_INDEX_TYPE,
+    version=settings.EMBEDDING_VERSION,
+    exact_vectors=embedding_matrix.get_many,
+)
+# Passages are keyed "<doc_id>:<passage_no>".
+passage_index = VectorIndex(
+    settings.EMBEDDING_DIM,
+    settings.PASSAGE_INDEX_PATH,
+    settings.VECTOR_INDEX_TYPE,
+    version=(
+        f"{settings.EMBEDDING_VERSION}:"
+        f"passages-{settings.PASSAGE_WORDS}-{settings.PASSAGE_OVERLAP}"
+    ),
+    group_of=lambda key: key.rpartition(":")[0],
+    exact_vectors=passage_vectors,
+)
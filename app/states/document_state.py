@@ -1,138 +1,256 @@
 import reflex as rx
 import asyncio
-from typing import TypedDict
+import contextlib
 import datetime
-import random
-import pymupdf
-import yake
-import spacy
 import numpy as np
-import hashlib
 import os
 import logging
-import faiss
+from collections.abc import Awaitable, Callable
+from app.services import fusion, ocr, pipeline, search, settings
+from app.services.checkpoint import checkpoint
+from app.services.document_store import document_store
+from app.services.embedding_matrix import embedding_matrix
+from app.services.embeddings import embedder
+from app.services.facet_index import facet_index
+from app.services.ingestion import ingestion_engine
+from app.services.job_queue import (
+    STAGE_ENTITIES,
+    STAGE_EXTRACTED,
+    STAGE_KEYWORDS,
+    LeaseLost,
+    job_queue,
+)
+from app.services.keyword_index import keyword_index
+from app.services.library_index import library_index
+from app.services.records import (
+    Document,
+    DocumentPage,
+    DocumentSummary,
+    PipelineResult,
+    SearchFilters,
+    SearchHit,
+    UploadProgress,
+)
+from app.services.related_graph import related_graph
+from app.services.search_cache import search_cache
+from app.services.uploads import UploadWriter
+from app.services.vector_index import passage_index, vector_index
 
 
-class DocumentEntity(TypedDict):
-    text: str
-    label: str
+SAMPLE_DOCUMENTS: list[Document] = [
+    {
+        "id": "101",
+        "title": "Semantic Indexing Foundations",
+        "author": "Dr. A. Smith",
+        "upload_date": "2024-05-01",
+        "file_path": "doc1.pdf",
+        "file_hash": "",
+        "status": "completed",
+        "pipeline_stage": 3,
+        "stage_detail": "",
+        "page_count": 0,
+        "extracted_text": "Semantic indexing improves information retrieval by focusing on the meaning of words rather than just their literal string matching. This monograph explores various techniques...",
+        "keywords": ["semantic", "indexing", "nlp", "retrieval"],
+        "entities": [
+            {"text": "Dr. A. Smith", "label": "PERSON"},
+            {"text": "MIT", "label": "ORG"},
+        ],
+    },
+    {
+        "id": "102",
+        "title": "Advanced OCR Techniques",
+        "author": "J. Doe",
+        "upload_date": "2024-05-02",
+        "file_path": "doc2.pdf",
+        "file_hash": "",
+        "status": "processing",
+        "pipeline_stage": 1,
+        "stage_detail": "",
+        "page_count": 0,
+        "extracted_text": "Optical Character Recognition (OCR) is the electronic or mechanical conversion of images of typed, handwritten or printed text into machine-encoded text...",
+        "keywords": [],
+        "entities": [],
+    },
+    {
+        "id": "103",
+        "title": "Neural Networks in 2024",
+        "author": "K. Lee",
+        "upload_date": "2024-05-10",
+        "file_path": "doc3.pdf",
+        "file_hash": "",
+        "status": "uploaded",
+        "pipeline_stage": 0,
+        "stage_detail": "",
+        "page_count": 0,
+        "extracted_text": "",
+        "keywords": [],
+        "entities": [],
+    },
+]
 
 
-class Document(TypedDict):
-    id: str
-    title: str
-    author: str
-    upload_date: str
-    file_path: str
-    status: str
-    pipeline_stage: int
-    extracted_text: str
-    keywords: list[str]
-    entities: list[DocumentEntity]
-    embedding: list[float]
-    score: float
+EMPTY_DOCUMENT: Document = {
+    "id": "0",
+    "title": "No Document Selected",
+    "author": "-",
+    "upload_date": "-",
+    "file_path": "",
+    "file_hash": "",
+    "status": "uploaded",
+    "pipeline_stage": 0,
+    "stage_detail": "",
+    "page_count": 0,
+    "extracted_text": "No content available.",
+    "keywords": [],
+    "entities": [],
+}
+
+# Document fields that the library filter searches.
+LIBRARY_FILTER_FIELDS = {"title", "author", "keywords", "entities"}
+# Document fields that the search facets index.
+FACET_FIELDS = {"author", "upload_date", "status", "keywords", "entities"}
+
+
+def save_document_fields(doc_id: str, **fields):
+    """Persists document fields and refreshes the indexes built from them."""
+    document_store.update(doc_id, **fields)
+    if "status" in fields:
+        search_cache.invalidate()
+    if fields.keys() & LIBRARY_FILTER_FIELDS:
+        library_index.refresh(doc_id)
+    if fields.keys() & FACET_FIELDS:
+        facet_index.refresh(doc_id)
 
 
 class DocumentState(rx.State):
-    documents: list[Document] = [
-        {
-            "id": "101",
-            "title": "Semantic Indexing Foundations",
-            "author": "Dr. A. Smith",
-            "upload_date": "2024-05-01",
-            "file_path": "doc1.pdf",
-            "status": "completed",
-            "pipeline_stage": 3,
-            "extracted_text": "Semantic indexing improves information retrieval by focusing on the meaning of words rather than just their literal string matching. This monograph explores various techniques...",
-            "keywords": ["semantic", "indexing", "nlp", "retrieval"],
-            "entities": [
-                {"text": "Dr. A. Smith", "label": "PERSON"},
-                {"text": "MIT", "label": "ORG"},
-            ],
-            "embedding": [],
-        },
-        {
-            "id": "102",
-            "title": "Advanced OCR Techniques",
-            "author": "J. Doe",
-            "upload_date": "2024-05-02",
-            "file_path": "doc2.pdf",
-            "status": "processing",
-            "pipeline_stage": 1,
-            "extracted_text": "Optical Character Recognition (OCR) is the electronic or mechanical conversion of images of typed, handwritten or printed text into machine-encoded text...",
-            "keywords": [],
-            "entities": [],
-            "embedding": [],
-        },
-        {
-            "id": "103",
-            "title": "Neural Networks in 2024",
-            "author": "K. Lee",
-            "upload_date": "2024-05-10",
-            "file_path": "doc3.pdf",
-            "status": "uploaded",
-            "pipeline_stage": 0,
-            "extracted_text": "",
-            "keywords": [],
-            "entities": [],
-            "embedding": [],
-        },
-    ]
+    documents: list[DocumentSummary] = []
+    # Position of each loaded summary in `documents`, by document id.
+    _document_positions: dict[str, int] = {}
+    library_total: int = 0
+    library_cursor: str = ""
+    library_sort: str = "newest"
+    library_page_size: int = settings.LIBRARY_PAGE_SIZE
+    library_trimmed: bool = False
+    selected_document: Document = EMPTY_DOCUMENT
+    # Extracted pages of the selected document, loaded as the viewer scrolls.
+    detail_pages: list[DocumentPage] = []
+    detail_page_cursor: int = 0
+    detail_has_more: bool = False
+    detail_pages_trimmed: bool = False
+    stats_total_documents: int = 0
+    stats_processing: int = 0
+    stats_completed: int = 0
     current_view: str = "dashboard"
     selected_document_id: str = ""
     is_uploading: bool = False
+    # One entry per file of the current upload, updated as its chunks arrive.
+    upload_progress: list[UploadProgress] = []
     view_mode: str = "grid"
     search_query: str = ""
     semantic_search_query: str = ""
-    search_results: list[Document] = []
-    related_documents: list[Document] = []
-    processing_queue: list[str] = []
-    is_processing_queue_running: bool = False
+    search_results: list[SearchHit] = []
+    search_filters: SearchFilters = {}
+    related_documents: list[SearchHit] = []
     is_sidebar_open: bool = False
 
-    @rx.var
-    def stats_total_documents(self) -> int:
-        return len(self.documents)
-
-    @rx.var
-    def stats_processing(self) -> int:
-        return len([d for d in self.documents if d["status"] == "processing"])
-
-    @rx.var
-    def stats_completed(self) -> int:
-        return len([d for d in self.documents if d["status"] == "completed"])
-
-    @rx.var
-    def filtered_documents(self) -> list[Document]:
-        if not self.search_query:
-            return self.documents
-        query = self.search_query.lower()
-        return [
-            d
-            for d in self.documents
-            if query in d["title"].lower() or query in d["author"].lower()
-        ]
-
-    @rx.var
-    def selected_document(self) -> Document:
-        found = [d for d in self.documents if d["id"] == self.selected_document_id]
-        if found:
-            return found[0]
-        return {
-            "id": "0",
-            "title": "No Document Selected",
-            "author": "-",
-            "upload_date": "-",
-            "file_path": "",
-            "status": "uploaded",
-            "pipeline_stage": 0,
-            "extracted_text": "No content available.",
-            "keywords": [],
-            "entities": [],
-            "embedding": [],
-            "score": 0.0,
+    def _refresh_stats(self):
+        counts = document_store.status_counts()
+        self.stats_total_documents = sum(counts.values())
+        self.stats_processing = counts.get("processing", 0)
+        self.stats_completed = counts.get("completed", 0)
+
+    def _fetch_library_page(self, cursor: str = "") -> tuple[list, str, int | None]:
+        """Returns a page of summaries, the next cursor and, when known, the total.
+
+        Filtered pages come from the in-memory library index once it is
+        loaded, and from the store's full-text index until then.
+        """
+        if self.search_query.strip() and library_index.ready:
+            doc_ids, next_cursor, total = library_index.page(
+                self.search_query,
+                limit=self.library_page_size,
+                sort=self.library_sort,
+                cursor=cursor,
+            )
+            return document_store.summaries(doc_ids), next_cursor, total
+        page, next_cursor = document_store.list_summaries(
+            limit=self.library_page_size,
+            query=self.search_query,
+            sort=self.library_sort,
+            cursor=cursor,
+        )
+        return page, next_cursor, None
+
+    def _reload_library(self):
+        """Loads the first page of the library for the current filter and sort."""
+        self.documents, self.library_cursor, total = self._fetch_library_page()
+        if total is None:
+            total = document_store.count(query=self.search_query)
+        self.library_total = total
+        self.library_trimmed = False
+        self._index_documents()
+
+    def _index_documents(self):
+        self._document_positions = {
+            summary["id"]: i for i, summary in enumerate(self.documents)
         }
 
+    def _update_document(self, doc_id: str, **fields):
+        """Persists pipeline fields and patches the projections that show the document."""
+        save_document_fields(doc_id, **fields)
+        i = self._document_positions.get(doc_id)
+        if i is not None:
+            summary = self.documents[i]
+            self.documents[i] = {
+                key: fields.get(key, value) for key, value in summary.items()
+            }
+        if self.selected_document_id == doc_id:
+            if self.detail_pages:
+                # The viewer shows the pages, not the text preview.
+                fields = {k: v for k, v in fields.items() if k != "extracted_text"}
+            self.selected_document = {**self.selected_document, **fields}
+            if fields.get("status") == "completed" and not self.detail_pages:
+                self._reload_detail_pages()
+        if "status" in fields:
+            self._refresh_stats()
+
+    @rx.event
+    def load_documents(self):
+        self._reload_library()
+        self._refresh_stats()
+
+    @rx.event
+    def load_more_documents(self):
+        if not self.library_cursor:
+            return
+        page, self.library_cursor, _ = self._fetch_library_page(self.library_cursor)
+        documents = self.documents + page
+        if len(documents) > settings.LIBRARY_MAX_LOADED:
+            documents = documents[len(documents) - settings.LIBRARY_MAX_LOADED :]
+            self.library_trimmed = True
+        self.documents = documents
+        self._index_documents()
+
+    @rx.event
+    def on_library_scroll(self, remaining: float):
+        """Fetches the next page once the user scrolls near the end of the list."""
+        if remaining < settings.LIBRARY_PREFETCH_PX:
+            self.load_more_documents()
+
+    @rx.event
+    def set_library_sort(self, sort: str):
+        self.library_sort = sort
+        self._reload_library()
+
+    @rx.event
+    def set_library_page_size(self, size: str):
+        self.library_page_size = int(size)
+        self._reload_library()
+
+    @rx.event
+    def reload_library(self):
+        self._reload_library()
+
     @rx.event
     def set_view(self, view: str):
         self.current_view = view
@@ -146,12 +264,54 @@ class DocumentState(rx.State):
     def close_sidebar(self):
         self.is_sidebar_open = False
 
+    def _reload_detail_pages(self):
+        self.detail_pages = []
+        self.detail_page_cursor = 0
+        self.detail_has_more = True
+        self.detail_pages_trimmed = False
+        self.load_more_pages()
+        if self.detail_pages:
+            self.selected_document = {**self.selected_document, "extracted_text": ""}
+
     @rx.event
     def select_document(self, doc_id: str):
         self.selected_document_id = doc_id
+        self.selected_document = document_store.get(doc_id) or EMPTY_DOCUMENT
         self.current_view = "detail"
+        # The related-documents fallback query reads the first loaded page.
+        self._reload_detail_pages()
         self.find_related_documents()
 
+    @rx.event
+    def load_more_pages(self):
+        if not self.detail_has_more:
+            return
+        pages = document_store.pages_after(
+            self.selected_document_id,
+            self.detail_page_cursor,
+            settings.TEXT_VIEWER_PAGES + 1,
+        )
+        self.detail_has_more = len(pages) > settings.TEXT_VIEWER_PAGES
+        pages = pages[: settings.TEXT_VIEWER_PAGES]
+        if not pages:
+            return
+        self.detail_page_cursor = pages[-1]["page_no"]
+        loaded = self.detail_pages + pages
+        if len(loaded) > settings.TEXT_VIEWER_MAX_LOADED:
+            loaded = loaded[len(loaded) - settings.TEXT_VIEWER_MAX_LOADED :]
+            self.detail_pages_trimmed = True
+        self.detail_pages = loaded
+
+    @rx.event
+    def on_text_scroll(self, remaining: float):
+        """Fetches the next pages once the user scrolls near the end of the text."""
+        if remaining < settings.TEXT_VIEWER_PREFETCH_PX:
+            self.load_more_pages()
+
+    @rx.event
+    def reload_detail_pages(self):
+        self._reload_detail_pages()
+
     @rx.event
     def toggle_view_mode(self):
         self.view_mode = "list" if self.view_mode == "grid" else "grid"
@@ -159,73 +319,115 @@ class DocumentState(rx.State):
     @rx.event
     def set_search_query(self, query: str):
         self.search_query = query
+        self._reload_library()
 
     @rx.event
     def set_semantic_search_query(self, query: str):
         self.semantic_search_query = query
 
-    def _generate_embedding(self, text: str) -> list[float]:
-        """Generates a mock embedding using the same hash-based strategy as the pipeline."""
-        dim = 128
-        vec = np.zeros(dim)
-        words = text.lower().split()
-        if not words:
-            return vec.tolist()
-        for word in words:
-            h = int(hashlib.md5(word.encode()).hexdigest(), 16) % dim
-            vec[h] += 1
-        norm = np.linalg.norm(vec)
-        if norm > 0:
-            vec = vec / norm
-        return vec.tolist()
-
     def _compute_hybrid_search(
-        self, query_text: str, top_k: int = 5, exclude_id: str = None
-    ) -> list[Document]:
-        completed_docs = [
-            d
-            for d in self.documents
-            if d["status"] == "completed" and d.get("embedding")
-        ]
-        if not completed_docs:
+        self,
+        query_text: str,
+        top_k: int = 5,
+        exclude_id: str = None,
+        query_embedding=None,
+        filters: SearchFilters | None = None,
+    ) -> list[SearchHit]:
+        filters = filters or {}
+        key = search_cache.key(query_text, top_k, exclude_id=exclude_id, **filters)
+        generation = search_cache.generation
+        results = search_cache.get(key)
+        if results is None:
+            results = self._score_hybrid_search(
+                query_text, top_k, exclude_id, query_embedding, filters
+            )
+            search_cache.put(key, results, generation)
+        return results
+
+    def _score_hybrid_search(
+        self,
+        query_text: str,
+        top_k: int,
+        exclude_id: str | None,
+        query_embedding,
+        filters: SearchFilters,
+    ) -> list[SearchHit]:
+        candidates = max(settings.SEARCH_CANDIDATES, top_k + 1)
+        # Filters select the documents before scoring, so a narrow filter
+        # still yields up to top_k results.
+        doc_ids = facet_index.select(filters)
+        if doc_ids is not None and not doc_ids:
             return []
-        dim = 128
-        embeddings = np.array([d["embedding"] for d in completed_docs]).astype(
-            "float32"
+        if query_embedding is None:
+            query_embedding = embedder.embed_query(query_text)
+        passage_hits = [
+            hit
+            for hit in search.search_passages(query_embedding, doc_ids=doc_ids)
+            if hit["doc_id"] != exclude_id
+        ][:candidates]
+        keyword_hits = [
+            (doc_id, score)
+            for doc_id, score in keyword_index.search(
+                query_text, candidates + 1, doc_ids
+            )
+            if doc_id != exclude_id
+        ][:candidates]
+        ids, scores = fusion.fuse(
+            [
+                [(hit["doc_id"], hit["score"]) for hit in passage_hits],
+                fusion.saturate(keyword_hits),
+            ],
+            [settings.FUSION_VECTOR_WEIGHT, settings.FUSION_KEYWORD_WEIGHT],
         )
-        index = faiss.IndexFlatL2(dim)
-        index.add(embeddings)
-        query_embedding = np.array([self._generate_embedding(query_text)]).astype(
-            "float32"
+        order = fusion.top_k(scores, top_k)
+        hits = document_store.search_hits([ids[i] for i in order], status="completed")
+        if len(hits) < len(order):
+            # Some candidates are being reprocessed; rank the rest as well.
+            order = fusion.top_k(scores, len(ids))
+            hits = document_store.search_hits(ids, status="completed")
+        order = [i for i in order if ids[i] in hits][:top_k]
+        best_passages = {hit["doc_id"]: hit for hit in passage_hits}
+        passages = document_store.get_passages(
+            (ids[i], best_passages[ids[i]]["passage_no"])
+            for i in order
+            if ids[i] in best_passages
         )
-        D, I = index.search(query_embedding, len(completed_docs))
-        query_terms = set(query_text.lower().split())
-        scored_docs = []
-        max_distance = np.max(D) if np.max(D) > 0 else 1.0
-        for rank, idx in enumerate(I[0]):
-            doc = completed_docs[idx]
-            if exclude_id and doc["id"] == exclude_id:
-                continue
-            distance = D[0][rank]
-            vector_score = 1 - distance / max_distance
-            text_lower = doc["extracted_text"].lower()
-            term_matches = sum((1 for term in query_terms if term in text_lower))
-            keyword_score = term_matches / len(query_terms) if query_terms else 0
-            final_score = 0.7 * vector_score + 0.3 * keyword_score
-            doc_copy = doc.copy()
-            doc_copy["score"] = final_score
-            scored_docs.append(doc_copy)
-        scored_docs.sort(key=lambda x: x["score"], reverse=True)
-        return scored_docs[:top_k]
+        results = []
+        for i in order:
+            result = hits[ids[i]]
+            result["score"] = float(scores[i])
+            hit = best_passages.get(result["id"])
+            passage = passages.get((result["id"], hit["passage_no"])) if hit else None
+            if passage is not None:
+                result["snippet"] = search.snippet(passage["text"])
+                result["snippet_page"] = passage["page_no"]
+            else:
+                result["snippet"] = search.snippet(result["snippet"])
+            results.append(result)
+        return results
+
+    @rx.event(background=True)
+    async def perform_semantic_search(self):
+        async with self:
+            query = self.semantic_search_query
+            filters = dict(self.search_filters)
+        results = []
+        if query.strip():
+            # Embedding the query is a model call with bertimbau, and waits
+            # for the model during warm-up, so it runs off the event loop.
+            results = await asyncio.to_thread(
+                self._compute_hybrid_search, query, top_k=10, filters=filters
+            )
+        async with self:
+            if self.semantic_search_query == query:
+                self.search_results = results
 
     @rx.event
-    def perform_semantic_search(self):
-        if not self.semantic_search_query.strip():
-            self.search_results = []
-            return
-        self.search_results = self._compute_hybrid_search(
-            self.semantic_search_query, top_k=10
-        )
+    def set_search_filter(self, name: str, value: str):
+        filters = {**self.search_filters, name: value.strip()}
+        self.search_filters = {key: value for key, value in filters.items() if value}
+        if self.semantic_search_query.strip():
+            return DocumentState.perform_semantic_search
 
     @rx.event
     def find_related_documents(self):
@@ -233,157 +435,569 @@ class DocumentState(rx.State):
         if current_doc["status"] != "completed":
             self.related_documents = []
             return
-        query_preview = current_doc["extracted_text"][:500]
+        if current_doc["id"] in related_graph:
+            neighbors = related_graph.neighbors(current_doc["id"])
+            hits = document_store.search_hits(
+                [doc_id for doc_id, _ in neighbors], status="completed"
+            )
+            related = []
+            for doc_id, similarity in neighbors:
+                if doc_id in hits:
+                    hit = hits[doc_id]
+                    hit["score"] = max(0.0, similarity)
+                    hit["snippet"] = search.snippet(hit["snippet"])
+                    related.append(hit)
+            self.related_documents = related[:4]
+            return
+        embedding = embedding_matrix.get(current_doc["id"])
+        query_text = (
+            " ".join(current_doc["keywords"])
+            or " ".join(page["text"] for page in self.detail_pages[:1])[:500]
+            or current_doc["extracted_text"][:500]
+        )
         self.related_documents = self._compute_hybrid_search(
-            query_preview, top_k=4, exclude_id=current_doc["id"]
+            query_text,
+            top_k=4,
+            exclude_id=current_doc["id"],
+            query_embedding=embedding,
         )
 
-    @rx.event
-    async def handle_upload(self, files: list[rx.UploadFile]):
-        self.is_uploading = True
-        upload_dir = rx.get_upload_dir()
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        queue_trigger = False
-        for file in files:
-            data = await file.read()
-            unique_name = f"{datetime.datetime.now().timestamp()}_{file.name}"
-            file_path = upload_dir / unique_name
-            with file_path.open("wb") as f:
-                f.write(data)
-            new_id = str(random.randint(10000, 99999))
+    def _register_upload(self, name: str, file_hash: str) -> bool:
+        """Adds an uploaded file to the library and the processing queue.
+
+        Returns False when the document is already in the library.
+        """
+        new_id = file_hash[:16]
+        existing = document_store.get(new_id)
+        if existing is not None and existing["status"] != "failed":
+            return False
+        if existing is None:
             new_doc: Document = {
                 "id": new_id,
-                "title": file.name,
+                "title": name,
                 "author": "Unknown Author",
                 "upload_date": datetime.datetime.now().strftime("%Y-%m-%d"),
-                "file_path": unique_name,
+                "file_path": f"{file_hash}.pdf",
+                "file_hash": file_hash,
                 "status": "uploaded",
                 "pipeline_stage": 0,
+                "stage_detail": "",
+                "page_count": 0,
                 "extracted_text": "",
                 "keywords": [],
                 "entities": [],
-                "embedding": [],
-                "score": 0.0,
             }
-            self.documents.insert(0, new_doc)
-            self.processing_queue.append(new_id)
-            queue_trigger = True
-        self.is_uploading = False
-        yield rx.toast.success(f"Uploaded {len(files)} files successfully!")
-        if queue_trigger and (not self.is_processing_queue_running):
-            self.is_processing_queue_running = True
-            yield DocumentState.process_next_document
+            document_store.insert(new_doc)
+            library_index.refresh(new_id)
+        else:
+            document_store.update(new_id, status="uploaded", pipeline_stage=0)
+        facet_index.refresh(new_id)
+        job_queue.enqueue(new_id, self.router.session.client_token)
+        self._reload_library()
+        self._refresh_stats()
+        return True
+
+    def _report_upload(
+        self, writer: UploadWriter, status: str, detail: str = "", new: bool = False
+    ):
+        progress: UploadProgress = {
+            "name": writer.name,
+            "bytes": writer.size,
+            "status": status,
+            "detail": detail
+            or (
+                f"{writer.size / 2**20:.1f} MB"
+                if writer.size >= 2**20
+                else f"{writer.size / 2**10:.0f} KB"
+            ),
+        }
+        if new:
+            self.upload_progress = [*self.upload_progress, progress]
+        else:
+            self.upload_progress = [*self.upload_progress[:-1], progress]
+
+    async def _finish_upload(self, writer: UploadWriter):
+        """Stores a fully received file and queues it for processing."""
+        try:
+            file_hash = await asyncio.to_thread(writer.commit)
+        except ValueError as e:
+            async with self:
+                self._report_upload(writer, "rejected", str(e))
+            return
+        async with self:
+            if self._register_upload(os.path.basename(writer.name), file_hash):
+                self._report_upload(writer, "uploaded")
+            else:
+                self._report_upload(writer, "duplicate", "Already in the library")
 
     @rx.event(background=True)
-    async def process_next_document(self):
+    async def handle_upload(self, chunk_iter: rx.UploadChunkIterator):
+        """Streams the uploaded files to disk, queueing each as it completes.
+
+        Chunks of one file arrive in order, and a file ends where the next
+        one (offset 0) begins, so only one chunk is held in memory at a time.
+        """
+        upload_dir = rx.get_upload_dir()
+        upload_dir.mkdir(parents=True, exist_ok=True)
         async with self:
-            if not self.processing_queue:
-                self.is_processing_queue_running = False
-                return
-            doc_id = self.processing_queue[0]
-            current_doc_idx = next(
-                (i for i, d in enumerate(self.documents) if d["id"] == doc_id), -1
+            self.is_uploading = True
+            self.upload_progress = []
+        writer: UploadWriter | None = None
+        name = None
+        reported = 0
+        try:
+            async for chunk in chunk_iter:
+                if chunk.offset == 0 or chunk.filename != name:
+                    if writer is not None:
+                        finished, writer = writer, None
+                        await self._finish_upload(finished)
+                    name = chunk.filename
+                    writer = UploadWriter(upload_dir, name)
+                    reported = 0
+                    async with self:
+                        self._report_upload(writer, "uploading", new=True)
+                if writer is None:
+                    # The rest of a rejected file.
+                    continue
+                try:
+                    writer.write(chunk.offset, chunk.data)
+                except ValueError as e:
+                    writer.abort()
+                    async with self:
+                        self._report_upload(writer, "rejected", str(e))
+                    writer = None
+                    continue
+                if writer.size - reported >= settings.UPLOAD_PROGRESS_BYTES:
+                    reported = writer.size
+                    async with self:
+                        self._report_upload(writer, "uploading")
+            if writer is not None:
+                finished, writer = writer, None
+                await self._finish_upload(finished)
+        except Exception as e:
+            logging.exception(f"Upload error: {e}")
+            yield rx.toast.error("The upload was interrupted.")
+        finally:
+            if writer is not None:
+                writer.abort()
+            async with self:
+                self.is_uploading = False
+                statuses = [progress["status"] for progress in self.upload_progress]
+        uploaded = statuses.count("uploaded")
+        if statuses.count("rejected"):
+            yield rx.toast.warning(
+                f"Uploaded {uploaded} files, {statuses.count('rejected')} rejected."
+            )
+        elif statuses.count("duplicate"):
+            yield rx.toast.info(
+                f"Uploaded {uploaded} files, "
+                f"{statuses.count('duplicate')} already in the library."
+            )
+        elif uploaded:
+            yield rx.toast.success(f"Uploaded {uploaded} files successfully!")
+
+    @rx.event
+    def cancel_processing(self, doc_id: str):
+        previous = job_queue.cancel(doc_id)
+        if previous == "pending":
+            self._update_document(
+                doc_id, status="failed", pipeline_stage=0, stage_detail=""
             )
-            if current_doc_idx == -1:
-                self.processing_queue.pop(0)
+        elif previous == "running":
+            ingestion_engine.cancel(doc_id)
+            return rx.toast.info("Cancelling document processing...")
+
+
+Reporter = Callable[..., Awaitable[None]]
+
+
+def session_reporter(app: rx.App, client_token: str) -> Reporter:
+    """Returns a `report(doc_id, **fields)` that stores a job's progress.
+
+    The fields are also patched into the state of the session that uploaded
+    the document, when there is one, so its views follow the job live.
+    """
+
+    async def report(doc_id: str, **fields):
+        if client_token:
+            try:
+                async with app.modify_state(
+                    rx.BaseStateToken(ident=client_token, cls=DocumentState)
+                ) as root:
+                    state = await root.get_state(DocumentState)
+                    state._update_document(doc_id, **fields)
                 return
-            self.documents[current_doc_idx]["status"] = "processing"
-            self.documents[current_doc_idx]["pipeline_stage"] = 1
-            self.documents[current_doc_idx]["extracted_text"] = (
-                "Extracting text from PDF..."
+            except Exception as e:
+                logging.exception(f"Progress Report Error for {doc_id}: {e}")
+        save_document_fields(doc_id, **fields)
+
+    return report
+
+
+async def run_jobs(app: rx.App):
+    """Processes the job queue for as long as the server runs."""
+
+    async def next_doc() -> str | None:
+        while True:
+            job_queue.added.clear()
+            job = job_queue.claim()
+            if job is not None:
+                return job["doc_id"]
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(
+                    job_queue.added.wait(), settings.JOB_POLL_INTERVAL
+                )
+
+    async def renew_leases():
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            job_queue.renew()
+
+    await asyncio.gather(
+        renew_leases(),
+        ingestion_engine.run(next_doc, lambda doc_id: run_job(app, doc_id)),
+    )
+
+
+async def run_job(app: rx.App, doc_id: str):
+    """Runs one claimed job, then retries, dead-letters or finishes it."""
+    job = job_queue.get(doc_id)
+    if job is None:
+        return
+    report = session_reporter(app, job["client_token"])
+
+    async def finish_cancelling() -> bool:
+        job = job_queue.get(doc_id)
+        if job is None or job["status"] != "cancelled":
+            return False
+        job_queue.remove(doc_id)
+        await report(
+            doc_id, status="failed", extracted_text="Processing was cancelled."
+        )
+        return True
+
+    try:
+        if job["status"] == "cancelled":
+            raise LeaseLost(doc_id)
+        if job["attempts"] > job_queue.max_attempts:
+            # The server stopped while running it on every attempt.
+            raise RuntimeError("the server stopped while processing it")
+        await ingest_document(report, doc_id, job["stage"])
+    except LeaseLost:
+        # Cancelled, or claimed again after the lease expired.
+        await finish_cancelling()
+    except asyncio.CancelledError:
+        # Otherwise the server is stopping and the job is handed back.
+        await finish_cancelling()
+        raise
+    except Exception as e:
+        logging.exception(f"Job Error for {doc_id}: {e}")
+        try:
+            delay = job_queue.fail(doc_id, str(e))
+        except LeaseLost:
+            # Cancelled, or claimed again after the lease expired.
+            await finish_cancelling()
+            return
+        if delay is None:
+            await report(
+                doc_id,
+                status="failed",
+                stage_detail="",
+                extracted_text=f"Processing failed after {job['attempts']} attempts: {e}",
             )
+        else:
+            await report(
+                doc_id,
+                status="uploaded",
+                stage_detail=f"Retrying in {delay:g} seconds",
+            )
+    else:
+        job_queue.complete(doc_id)
+
+
+async def ingest_document(report: Reporter, doc_id: str, stage: int = 0):
+    """Runs the pipeline stages for one document, reporting each stage to `report`.
+
+    `stage` is the job's last checkpoint: the stages it had completed before
+    a failed attempt or a restart are not run again. The stages run in the
+    worker pools, so the event loop stays free for other users. Raises when
+    the document could not be processed, for the job to be retried.
+    """
+    timeouts = settings.STAGE_TIMEOUTS
+    current_doc = document_store.get(doc_id)
+    if current_doc is None:
+        return
+    file_hash = current_doc["file_hash"]
+    if stage == 0 and file_hash:
+        cached = await ingestion_engine.run_stage(
+            restore_cached_result, doc_id, file_hash, in_thread=True
+        )
+        if cached is not None:
+            await report(
+                doc_id,
+                author=cached["author"]
+                if current_doc["author"] == "Unknown Author"
+                else current_doc["author"],
+                page_count=cached["page_count"],
+                extracted_text=cached["extracted_text"],
+                keywords=cached["keywords"],
+                entities=cached["entities"],
+                status="completed",
+                pipeline_stage=3,
+                stage_detail="",
+            )
+            return
+    if stage < STAGE_EXTRACTED:
+        await report(
+            doc_id,
+            status="processing",
+            pipeline_stage=1,
+            stage_detail="",
+            extracted_text="Extracting text from PDF...",
+        )
+        file_path = rx.get_upload_dir() / current_doc["file_path"]
+        progress = {"done": 0, "total": 0, "cancelled": False}
+        extraction = asyncio.ensure_future(
+            ingestion_engine.run_stage(
+                pipeline.extract_pages,
+                doc_id,
+                str(file_path),
+                progress,
+                timeout=timeouts["extract"],
+                in_thread=True,
+            )
+        )
         try:
-            upload_dir = rx.get_upload_dir()
-            async with self:
-                filename = self.documents[current_doc_idx]["file_path"]
-            file_path = upload_dir / filename
-            extracted_text = ""
-            try:
-                doc = pymupdf.open(file_path)
-                for page in doc:
-                    extracted_text += (
-                        page.get_text()
-                        + """
-"""
+            reported = 0
+            while not extraction.done():
+                await asyncio.wait({extraction}, timeout=settings.PROGRESS_INTERVAL)
+                if progress["done"] != reported:
+                    reported = progress["done"]
+                    await report(
+                        doc_id, stage_detail=f"Page {reported} of {progress['total']}"
                     )
-                doc.close()
-            except Exception as e:
-                logging.exception(f"PDF Extraction Error: {e}")
-                extracted_text = f"Error extracting text: {str(e)}"
-                async with self:
-                    self.documents[current_doc_idx]["status"] = "failed"
-                    self.documents[current_doc_idx]["extracted_text"] = extracted_text
-                    self.processing_queue.pop(0)
-                return
-            if not extracted_text.strip():
-                extracted_text = "No text could be extracted from this document (it might be an image scan without OCR layer)."
-            async with self:
-                self.documents[current_doc_idx]["extracted_text"] = extracted_text
-                self.documents[current_doc_idx]["pipeline_stage"] = 2
-            keywords = []
-            try:
-                kw_extractor = yake.KeywordExtractor(
-                    lan="pt", n=2, dedupLim=0.9, top=10, features=None
+            extraction_result = extraction.result()
+        except asyncio.CancelledError:
+            extraction.cancel()
+            raise
+        except Exception as e:
+            logging.exception(f"PDF Extraction Error: {e}")
+            await report(doc_id, extracted_text=f"Error extracting text: {str(e)}")
+            raise
+        finally:
+            # A timed-out or abandoned extraction keeps running in its thread
+            # until it sees this, and must not write pages for a retry.
+            progress["cancelled"] = True
+        extracted_text = extraction_result["nlp_text"]
+        preview = extraction_result["preview"]
+        # Shown with the document once processed, such as pages OCR could not read.
+        notice = ""
+        if extraction_result["ocr_pages"] and settings.OCR_ENABLED:
+            failed = await ocr_pages(
+                report, doc_id, str(file_path), extraction_result["ocr_pages"]
+            )
+            if failed:
+                notice = (
+                    f"OCR failed on {len(failed)} of "
+                    f"{len(extraction_result['ocr_pages'])} scanned pages"
                 )
-                keywords_extracted = kw_extractor.extract_keywords(extracted_text)
-                keywords = [k[0] for k in keywords_extracted]
-            except Exception as e:
-                logging.exception(f"YAKE Error: {e}")
-                keywords = ["Processing Error"]
-            async with self:
-                self.documents[current_doc_idx]["keywords"] = keywords
-                self.documents[current_doc_idx]["pipeline_stage"] = 3
-            entities = []
-            try:
-                try:
-                    nlp = spacy.load("pt_core_news_sm")
-                except Exception as e:
-                    logging.exception(f"Spacy load error: {e}")
-                    nlp = spacy.blank("pt")
-                doc_nlp = nlp(extracted_text[:100000])
-                seen_entities = set()
-                for ent in doc_nlp.ents:
-                    if (
-                        ent.label_ in ["PER", "ORG", "LOC", "MISC", "DATE"]
-                        and ent.text not in seen_entities
-                    ):
-                        entities.append({"text": ent.text, "label": ent.label_})
-                        seen_entities.add(ent.text)
-                if (
-                    not self.documents[current_doc_idx]["author"]
-                    or self.documents[current_doc_idx]["author"] == "Unknown Author"
-                ):
-                    authors = [e["text"] for e in entities if e["label"] == "PER"]
-                    if authors:
-                        async with self:
-                            self.documents[current_doc_idx]["author"] = authors[0]
-            except Exception as e:
-                logging.exception(f"NER Error: {e}")
-            embedding = []
-            try:
-                dim = 128
-                vec = np.zeros(dim)
-                words = extracted_text.lower().split()
-                for word in words:
-                    h = int(hashlib.md5(word.encode()).hexdigest(), 16) % dim
-                    vec[h] += 1
-                norm = np.linalg.norm(vec)
-                if norm > 0:
-                    vec = vec / norm
-                embedding = vec.tolist()
-            except Exception as e:
-                logging.exception(f"Embedding Error: {e}")
-                embedding = [0.0] * 128
-            async with self:
-                self.documents[current_doc_idx]["entities"] = entities[:20]
-                self.documents[current_doc_idx]["embedding"] = embedding
-                self.documents[current_doc_idx]["status"] = "completed"
-                self.documents[current_doc_idx]["pipeline_stage"] = 3
-                self.processing_queue.pop(0)
-            yield DocumentState.process_next_document
+            extracted_text = await ingestion_engine.run_stage(
+                pipeline.text_prefix, doc_id, in_thread=True
+            )
+            preview = extracted_text[: settings.TEXT_PREVIEW_CHARS]
+        if not extracted_text.strip():
+            preview = "No text could be extracted from this document (it might be an image scan without OCR layer)."
+        page_count = extraction_result["page_count"]
+        await report(
+            doc_id,
+            extracted_text=preview,
+            page_count=page_count,
+            stage_detail=notice,
+            pipeline_stage=2,
+        )
+        job_queue.checkpoint(doc_id, STAGE_EXTRACTED)
+    else:
+        # Resuming: the pages are already stored.
+        extracted_text = await ingestion_engine.run_stage(
+            pipeline.text_prefix, doc_id, in_thread=True
+        )
+        preview = current_doc["extracted_text"]
+        page_count = current_doc["page_count"]
+        # The OCR failures of an earlier attempt are in its log.
+        notice = ""
+        await report(
+            doc_id,
+            status="processing",
+            stage_detail="",
+            pipeline_stage=2 if stage < STAGE_KEYWORDS else 3,
+        )
+    if stage < STAGE_KEYWORDS:
+        try:
+            keywords = await ingestion_engine.run_stage(
+                pipeline.extract_keywords, extracted_text, timeout=timeouts["keywords"]
+            )
         except Exception as e:
-            logging.exception(f"Critical Pipeline Error: {e}")
-            async with self:
-                if self.processing_queue:
-                    self.processing_queue.pop(0)
-            yield DocumentState.process_next_document
\ No newline at end of file
+            logging.exception(f"YAKE Error: {e}")
+            keywords = ["Processing Error"]
+        await report(doc_id, keywords=keywords, pipeline_stage=3)
+        job_queue.checkpoint(doc_id, STAGE_KEYWORDS)
+    else:
+        keywords = current_doc["keywords"]
+    if stage < STAGE_ENTITIES:
+        entities = []
+        try:
+            entities = await ingestion_engine.run_stage(
+                pipeline.extract_entities, extracted_text, timeout=timeouts["entities"]
+            )
+            if not current_doc["author"] or current_doc["author"] == "Unknown Author":
+                authors = [e["text"] for e in entities if e["label"] == "PER"]
+                if authors:
+                    current_doc["author"] = authors[0]
+                    await report(doc_id, author=authors[0])
+        except Exception as e:
+            logging.exception(f"NER Error: {e}")
+        entities = entities[:20]
+        await report(doc_id, entities=entities)
+        job_queue.checkpoint(doc_id, STAGE_ENTITIES)
+    else:
+        entities = current_doc["entities"]
+    try:
+        embedding = await ingestion_engine.run_stage(
+            pipeline.embed_document, doc_id, timeout=timeouts["embedding"]
+        )
+    except Exception as e:
+        # Retried with the job rather than indexed as a zero vector.
+        logging.exception(f"Embedding Error: {e}")
+        raise
+    try:
+        await ingestion_engine.run_stage(
+            index_document,
+            doc_id,
+            embedding,
+            timeout=timeouts["indexing"],
+            in_thread=True,
+        )
+    except Exception as e:
+        logging.exception(f"Indexing Error: {e}")
+    await report(doc_id, status="completed", pipeline_stage=3, stage_detail=notice)
+    if file_hash:
+        result: PipelineResult = {
+            "author": current_doc["author"],
+            "page_count": page_count,
+            "extracted_text": preview,
+            "keywords": keywords,
+            "entities": entities,
+            "embedding": embedding,
+        }
+        try:
+            await ingestion_engine.run_stage(
+                document_store.put_cached_result,
+                file_hash,
+                pipeline.CACHE_VERSION,
+                doc_id,
+                result,
+                in_thread=True,
+            )
+        except Exception as e:
+            logging.exception(f"Pipeline Cache Error: {e}")
+
+
+async def ocr_pages(
+    report: Reporter, doc_id: str, file_path: str, page_nos: list[int]
+) -> list[int]:
+    """OCRs the pages without a text layer across the process pool.
+
+    Pages are read a window of one per worker at a time, so other documents'
+    stages are not queued behind every page. Returns the pages that failed.
+    """
+    failed = []
+
+    async def read_page(page_no: int) -> str | None:
+        try:
+            return await ingestion_engine.run_stage(
+                ocr.ocr_page,
+                file_path,
+                page_no,
+                timeout=settings.STAGE_TIMEOUTS["ocr_page"],
+            )
+        except Exception as e:
+            logging.exception(f"OCR Error on page {page_no}: {e}")
+            failed.append(page_no)
+            return None
+
+    for start in range(0, len(page_nos), ingestion_engine.workers):
+        window = page_nos[start : start + ingestion_engine.workers]
+        texts = await asyncio.gather(*(read_page(page_no) for page_no in window))
+        document_store.add_pages(
+            doc_id, [(page_no, text) for page_no, text in zip(window, texts) if text]
+        )
+        await report(
+            doc_id,
+            stage_detail=f"OCR page {start + len(window)} of {len(page_nos)}",
+        )
+    await report(doc_id, stage_detail="")
+    if failed:
+        logging.warning(f"OCR failed on pages {sorted(failed)} of {doc_id}")
+    return sorted(failed)
+
+
+def restore_cached_result(doc_id: str, file_hash: str) -> PipelineResult | None:
+    """Restores a file's cached pages and indexes them if its outputs are cached."""
+    cached = document_store.get_cached_result(file_hash, pipeline.CACHE_VERSION)
+    if cached is None:
+        return None
+    document_store.delete_pages(doc_id)
+    document_store.add_pages(doc_id, cached.pop("pages"))
+    if not len(passage_index.labels_for([doc_id])):
+        # Passages stored by an earlier attempt may be of another embedding
+        # version; only those in the current passage index are kept.
+        cached["embedding"] = pipeline.embed_document(doc_id)
+    index_document(doc_id, cached["embedding"])
+    return cached
+
+
+def index_document(doc_id: str, embedding: np.ndarray):
+    """Adds a document to the indexes; they are saved at the next checkpoint."""
+    try:
+        embedding_matrix.put(doc_id, embedding)
+        checkpoint.mark(embedding_matrix)
+    except Exception as e:
+        logging.exception(f"Embedding Matrix Error: {e}")
+    try:
+        vector_index.add(doc_id, embedding)
+        checkpoint.mark(vector_index)
+        pipeline.index_passages(doc_id)
+    except Exception as e:
+        logging.exception(f"Vector Index Error: {e}")
+    try:
+        related_graph.update(doc_id, embedding)
+        checkpoint.mark(related_graph)
+    except Exception as e:
+        logging.exception(f"Related Graph Error: {e}")
+    try:
+        keyword_index.add_pages(doc_id, document_store.iter_page_texts(doc_id))
+        checkpoint.mark(keyword_index)
+    except Exception as e:
+        logging.exception(f"Keyword Index Error: {e}")
+
+
+def index_missing_documents() -> int:
+    """Indexes completed documents missing from the saved indexes.
+
+    These are documents completed after the last checkpoint of a previous run
+    of the server that did not stop cleanly. Run off the event loop.
+    """
+    missing = [
+        doc_id
+        for doc_id in document_store.ids(status="completed")
+        if doc_id not in vector_index and document_store.count_passages(doc_id)
+    ]
+    for doc_id in missing:
+        embedding = embedding_matrix.get(doc_id)
+        if embedding is None:
+            embedding = pipeline.embed_document(doc_id)
+        index_document(doc_id, embedding)
+    if missing:
+        logging.warning(f"Indexed {len(missing)} documents missing from the indexes")
+        checkpoint.flush()
+    return len(missing)
@@ -0,0 +1,100 @@
+"""Recall@10 and latency of the approximate vector backends against the flat index.
+
+Run from the repository root, e.g.::
+
+    python -m benchmarks.ann_recall --docs 100000 --queries 500
+    python -m benchmarks.ann_recall --from-index .data/vectors.faiss
+
+Synthetic vectors mimic the pipeline's L2-normalised hashed term counts.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.services import settings
+from app.services.vector_index import VectorIndex
+
+
+def synthetic_corpus(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    topics = rng.gamma(0.3, size=(max(n // 200, 8), dim))
+    mix = topics[rng.integers(0, len(topics), size=n)]
+    vectors = rng.poisson(mix * 40 + 0.5).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-9
+    return vectors
+
+
+def load_vectors(path: Path) -> np.ndarray:
+    index = faiss.read_index(str(path))
+    return faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+
+
+def build(index_type: str, vectors: np.ndarray, **params) -> tuple[VectorIndex, float]:
+    index = VectorIndex(vectors.shape[1], index_type=index_type, **params)
+    started = time.perf_counter()
+    index.add_many([str(i) for i in range(len(vectors))], vectors)
+    index.train()
+    return index, time.perf_counter() - started
+
+
+def evaluate(
+    index: VectorIndex, queries: np.ndarray, truth: list[set], k: int, **search
+):
+    hits = 0
+    started = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        found = {doc_id for doc_id, _ in index.search(query, k, **search)[:10]}
+        hits += len(found & expected)
+    elapsed = time.perf_counter() - started
+    return hits / (10 * len(queries)), elapsed / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=settings.SEARCH_CANDIDATES)
+    parser.add_argument("--nlist", type=int, default=settings.IVF_NLIST)
+    parser.add_argument("--from-index", type=Path, default=None)
+    args = parser.parse_args()
+
+    if args.from_index:
+        vectors = load_vectors(args.from_index)
+    else:
+        vectors = synthetic_corpus(args.docs, settings.EMBEDDING_DIM)
+    queries = vectors[np.random.default_rng(1).choice(len(vectors), args.queries)]
+    queries = queries + np.random.default_rng(2).normal(0, 0.02, queries.shape)
+    queries = queries.astype("float32")
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries")
+
+    flat, build_s = build("flat", vectors)
+    truth = [{doc_id for doc_id, _ in flat.search(q, 10)} for q in queries]
+    _, flat_ms = evaluate(flat, queries, truth, 10)
+    print(f"{'flat':<10} {'':<14} recall@10=1.000  {flat_ms:7.2f} ms/query")
+
+    configs = [
+        ("ivf_flat", {"nlist": args.nlist}, "nprobe", [1, 4, 8, 16, 32, 64]),
+        ("ivf_pq", {"nlist": args.nlist}, "nprobe", [4, 8, 16, 32, 64]),
+        ("hnsw", {}, "ef_search", [16, 32, 64, 128, 256]),
+    ]
+    for index_type, params, knob, values in configs:
+        index, build_s = build(index_type, vectors, **params)
+        if not index.ann_ready:
+            print(f"{index_type:<10} skipped: needs {index.min_train_size} vectors")
+            continue
+        print(f"{index_type:<10} built in {build_s:.1f}s")
+        for value in values:
+            recall, ms = evaluate(
+                index, queries, truth, args.candidates, **{knob: value}
+            )
+            print(
+                f"{'':<10} {knob}={value:<6} recall@10={recall:.3f}  {ms:7.2f} ms/query"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Serialized size of search results as full documents versus slim search hits.
+
+Run from the repository root, e.g.::
+
+    python -m benchmarks.search_payload --results 10 --text-chars 20000
+
+Documents are synthetic, with an extracted-text preview of `--text-chars`
+characters, YAKE-sized keyword lists and NER-sized entity lists. The "full"
+shape is what search results used to carry: the whole document record plus
+its embedding as a list of floats.
+"""
+
+import argparse
+import json
+import random
+import string
+
+from app.services import search, settings
+from app.services.document_store import DocumentStore
+
+
+def synthetic_documents(n: int, text_chars: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+
+    def words(count: int) -> str:
+        return " ".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+            for _ in range(count)
+        )
+
+    docs = []
+    for i in range(n):
+        text = words(text_chars // 6)[:text_chars]
+        docs.append(
+            {
+                "id": f"{i:016x}",
+                "title": words(8).title(),
+                "author": words(2).title(),
+                "upload_date": "2024-05-01",
+                "file_path": f"{i:064x}.pdf",
+                "file_hash": f"{i:064x}",
+                "status": "completed",
+                "pipeline_stage": 3,
+                "stage_detail": "",
+                "page_count": 240,
+                "extracted_text": text,
+                "keywords": [words(2) for _ in range(10)],
+                "entities": [{"text": words(2), "label": "PER"} for _ in range(20)],
+            }
+        )
+    return docs
+
+
+def payload_bytes(results: list[dict]) -> int:
+    return len(json.dumps(results).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=10)
+    parser.add_argument("--text-chars", type=int, default=settings.TEXT_PREVIEW_CHARS)
+    args = parser.parse_args()
+
+    store = DocumentStore(":memory:")
+    docs = synthetic_documents(args.results, args.text_chars)
+    for doc in docs:
+        store.insert(doc)
+    doc_ids = [doc["id"] for doc in docs]
+
+    full = []
+    for doc in store.get_many(doc_ids).values():
+        doc["embedding"] = [0.123456789] * settings.EMBEDDING_DIM
+        doc["score"] = 0.5
+        doc["snippet"] = search.snippet(doc["extracted_text"])
+        doc["snippet_page"] = 1
+        full.append(doc)
+    hits = []
+    for hit in store.search_hits(doc_ids).values():
+        hit["score"] = 0.5
+        hit["snippet"] = search.snippet(hit["snippet"])
+        hits.append(hit)
+
+    full_bytes = payload_bytes(full)
+    hit_bytes = payload_bytes(hits)
+    print(f"{args.results} results, {args.text_chars} characters of text each")
+    print(f"{'full documents':<16} {full_bytes:>10,} bytes")
+    print(f"{'search hits':<16} {hit_bytes:>10,} bytes")
+    print(f"{'reduction':<16} {full_bytes / hit_bytes:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()